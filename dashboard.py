@@ -1,12 +1,19 @@
+import threading
 import time
+from collections import OrderedDict
 
 import plotly.express as px
 import plotly.graph_objects as go
 import requests
 import streamlit as st
-from pandas import DataFrame
+from pandas import DataFrame, to_datetime
 
 API_URL = "http://localhost:8000"
+# Réponses conservées avec leur ETag pour les GET conditionnels (LRU partagé par les sessions)
+API_VALIDATORS_MAX_ENTRIES = 256
+
+# Dates des clients : ISO 8601 depuis l'API 2.0 (dates BSON natives), "YYYY-MM-DD HH:MM:SS" avant
+CLIENT_DATE_COLUMNS = ["date_inscription", "premier_achat", "dernier_achat"]
 
 st.set_page_config(
     page_title="BigData Analytics Dashboard",
@@ -24,15 +31,67 @@ page = st.sidebar.radio(
 )
 
 
+class ValidatorCache:
+    """ETag and data of the last responses, least recently used evicted first (thread-safe)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key: tuple, etag: str, data) -> None:
+        with self.lock:
+            self.entries[key] = (etag, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+@st.cache_resource
+def api_validators() -> ValidatorCache:
+    # Conservé entre les reruns et les sessions, borné : les paramètres (limite, pays) sont libres
+    return ValidatorCache(API_VALIDATORS_MAX_ENTRIES)
+
+
+def parse_client_dates(df: DataFrame) -> DataFrame:
+    for column in CLIENT_DATE_COLUMNS:
+        if column in df:
+            df[column] = to_datetime(df[column], format="ISO8601")
+    return df
+
+
 def fetch_api(endpoint: str, params: dict = None) -> dict:
     try:
+        key = (endpoint, tuple(sorted((params or {}).items())))
+        validators = api_validators()
+        cached = validators.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        
         start_time = time.time()
-        response = requests.get(f"{API_URL}{endpoint}", params=params, timeout=10)
+        response = requests.get(f"{API_URL}{endpoint}", params=params, headers=headers, timeout=10)
         elapsed = (time.time() - start_time) * 1000
         
-        if response.status_code == 200:
+        if response.status_code == 304 and cached:
+            # Données inchangées depuis la dernière réponse : rien n'a été retéléchargé
+            return {
+                "data": cached[1],
+                "success": True,
+                "response_time": elapsed
+            }
+        elif response.status_code == 200:
+            data = response.json()
+            etag = response.headers.get("ETag")
+            if etag:
+                validators.set(key, etag, data)
             return {
-                "data": response.json(),
+                "data": data,
                 "success": True,
                 "response_time": elapsed
             }
@@ -106,7 +165,7 @@ elif page == "Clients":
     result = fetch_api("/clients", params)
     
     if result["success"]:
-        df = DataFrame(result["data"])
+        df = parse_client_dates(DataFrame(result["data"]))
         
         st.metric("Temps de réponse API", f"{result['response_time']:.2f} ms")
         
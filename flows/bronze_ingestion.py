@@ -1,58 +1,200 @@
+import hashlib
+import json
 from io import BytesIO
 from pathlib import Path
 
+from minio.commonconfig import ComposeSource
+from minio.error import S3Error
 from prefect import flow, task
+from prefect.task_runners import ThreadPoolTaskRunner
 
-from config import BUCKET_BRONZE, BUCKET_SOURCES, get_minio_client
+from compression import CODECS, compressing_reader
+from config import (
+    BRONZE_MANIFEST,
+    BUCKET_BRONZE,
+    BUCKET_SOURCES,
+    INGESTION_MAX_WORKERS,
+    MULTIPART_PARALLEL_UPLOADS,
+    MULTIPART_PART_SIZE,
+    get_minio_client,
+)
 
 @task(name="upload_to_sources", retries=2)
-def upload_csv_to_souces(file_path: str, object_name: str) -> str:
+def upload_csv_to_souces(file_path: str, object_name: str, part_size: int = MULTIPART_PART_SIZE) -> str:
     client = get_minio_client()
 
     if not client.bucket_exists(BUCKET_SOURCES):
         client.make_bucket(BUCKET_SOURCES)
 
-    client.fput_object(BUCKET_SOURCES, object_name, file_path)
+    client.fput_object(
+        BUCKET_SOURCES,
+        object_name,
+        file_path,
+        content_type="text/csv",
+        part_size=part_size,
+        num_parallel_uploads=MULTIPART_PARALLEL_UPLOADS
+    )
     print(f"Uploaded {object_name} to {BUCKET_SOURCES}")
     return object_name
 
+def stream_copy_object(
+    client,
+    object_name: str,
+    part_size: int = MULTIPART_PART_SIZE,
+    codec: str | None = None
+) -> None:
+    """Copy an object through the worker one part at a time (memory bounded by part_size).
+
+    With a codec, the data is compressed on the fly and the codec is recorded
+    in the object metadata so readers can decompress it transparently.
+    """
+    stat = client.stat_object(BUCKET_SOURCES, object_name)
+    response = client.get_object(BUCKET_SOURCES, object_name)
+    try:
+        # Un seul upload à la fois : les parts lues ne s'accumulent pas en mémoire
+        client.put_object(
+            BUCKET_BRONZE,
+            object_name,
+            compressing_reader(response, codec) if codec else response,
+            length=-1 if codec else stat.size,
+            content_type=stat.content_type or "application/octet-stream",
+            metadata={"codec": codec} if codec else None,
+            part_size=part_size,
+            num_parallel_uploads=1
+        )
+    finally:
+        response.close()
+        response.release_conn()
+
 @task(name="copy_to_bronze", retries=2)
-def copy_to_bronze_layer(object_name: str) -> str:
+def copy_to_bronze_layer(object_name: str, compression: str | None = None) -> str:
     client = get_minio_client()
 
     if not client.bucket_exists(BUCKET_BRONZE):
         client.make_bucket(BUCKET_BRONZE)
-    
-    response = client.get_object(BUCKET_SOURCES, object_name)
-    data = response.read()
-    response.close()
-    response.release_conn()
 
+    if compression:
+        stream_copy_object(client, object_name, codec=compression)
+        print(f"Copied {object_name} to {BUCKET_BRONZE} ({compression})")
+        return object_name
+
+    # Copie côté serveur : aucun octet ne transite par le worker
+    # (compose_object découpe en upload_part_copy au-delà de 5 GiB)
+    try:
+        client.compose_object(
+            BUCKET_BRONZE,
+            object_name,
+            [ComposeSource(BUCKET_SOURCES, object_name)]
+        )
+        print(f"Copied {object_name} to {BUCKET_BRONZE} (server-side)")
+    except S3Error as e:
+        print(f"Server-side copy of {object_name} failed ({e.code}), streaming instead")
+        stream_copy_object(client, object_name)
+        print(f"Copied {object_name} to {BUCKET_BRONZE} (streamed)")
+    return object_name
+
+def file_sha256(file_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@task(name="load_bronze_manifest", retries=2)
+def load_manifest() -> dict:
+    client = get_minio_client()
+
+    if not client.bucket_exists(BUCKET_BRONZE):
+        return {}
+
+    try:
+        response = client.get_object(BUCKET_BRONZE, BRONZE_MANIFEST)
+    except S3Error as e:
+        if e.code == "NoSuchKey":
+            return {}
+        raise
+    try:
+        manifest = json.loads(response.read())
+    finally:
+        response.close()
+        response.release_conn()
+
+    print(f"Loaded manifest with {len(manifest)} files")
+    return manifest
+
+@task(name="save_bronze_manifest", retries=2)
+def save_manifest(manifest: dict) -> str:
+    client = get_minio_client()
+
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
     client.put_object(
         BUCKET_BRONZE,
-        object_name,
+        BRONZE_MANIFEST,
         BytesIO(data),
-        length=len(data)
+        length=len(data),
+        content_type="application/json"
     )
-    print(f"Copied {object_name} to {BUCKET_BRONZE}")
-    return object_name
+    print(f"Saved manifest with {len(manifest)} files")
+    return BRONZE_MANIFEST
+
+@task(name="fingerprint_source_file")
+def fingerprint_source_file(file_path: str, previous: dict | None, compression: str | None = None) -> dict:
+    stat = Path(file_path).stat()
+    entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "codec": compression}
+
+    # Un changement de codec impose de réécrire l'objet bronze
+    if previous and previous.get("codec") != compression:
+        previous = None
+
+    # Taille et mtime identiques : on fait confiance au manifeste sans relire le fichier
+    if previous and previous.get("size") == entry["size"] and previous.get("mtime_ns") == entry["mtime_ns"]:
+        return {**previous, "changed": False}
+
+    entry["sha256"] = file_sha256(Path(file_path))
+    entry["changed"] = not previous or previous.get("sha256") != entry["sha256"]
+    return entry
+
+@flow(name="Bronze Ingestion Flow", task_runner=ThreadPoolTaskRunner(max_workers=INGESTION_MAX_WORKERS))
+def bronze_ingestion_flow(data_dir: str = "./data/sources", compression: str | None = None) -> dict:
+    if compression is not None and compression not in CODECS:
+        raise ValueError(f"Unsupported compression: {compression} (expected one of {CODECS})")
 
-@flow(name="Bronze Ingestion Flow")
-def bronze_ingestion_flow(data_dir: str = "./data/sources") -> dict:
     data_path = Path(data_dir)
+    source_files = {
+        path.relative_to(data_path).as_posix(): str(path)
+        for path in sorted(data_path.rglob("*"))
+        if path.is_file() and not path.name.startswith(".")
+    }
+
+    manifest = load_manifest()
+
+    fingerprints = {
+        object_name: fingerprint_source_file.submit(file_path, manifest.get(object_name), compression)
+        for object_name, file_path in source_files.items()
+    }
+
+    copies = {}
+    new_manifest = {}
+    for object_name, future in fingerprints.items():
+        entry = future.result()
+        changed = entry.pop("changed")
+        if changed:
+            uploaded = upload_csv_to_souces.submit(source_files[object_name], object_name)
+            copies[object_name] = copy_to_bronze_layer.submit(uploaded, compression)
+        new_manifest[object_name] = entry
 
-    clients_file = str(data_path / "clients.csv")
-    achats_file = str(data_path / "achats.csv")
+    for object_name, future in copies.items():
+        future.result()
 
-    clients_name = upload_csv_to_souces(clients_file, "clients.csv")
-    achats_name = upload_csv_to_souces(achats_file, "achats.csv")
+    # Les fichiers absents du répertoire restent dans le manifeste (et dans bronze)
+    save_manifest({**manifest, **new_manifest})
 
-    bronze_clients = copy_to_bronze_layer(clients_name)
-    bronze_achats = copy_to_bronze_layer(achats_name)
+    unchanged = sorted(set(source_files) - set(copies))
+    print(f"Ingested {len(copies)} new or changed files, skipped {len(unchanged)} unchanged")
 
     return {
-        "clients": bronze_clients,
-        "achats": bronze_achats
+        "ingested": sorted(copies),
+        "unchanged": unchanged
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+import gzip
+import zlib
+from typing import BinaryIO
+
+# Codecs supported for bronze objects, recorded in the "codec" object metadata
+CODECS = ("gzip", "zstd")
+CODEC_METADATA_KEY = "x-amz-meta-codec"
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("zstd compression requires the 'zstandard' package") from e
+    return zstandard
+
+
+class GzipCompressingReader:
+    """Readable stream returning the gzip-compressed content of another stream."""
+
+    def __init__(self, raw: BinaryIO, chunk_size: int = CHUNK_SIZE):
+        self._raw = raw
+        self._chunk_size = chunk_size
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        self._buffer = bytearray()
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = self._raw.read(self._chunk_size)
+            if chunk:
+                self._buffer += self._compressor.compress(chunk)
+            else:
+                self._buffer += self._compressor.flush()
+                self._eof = True
+
+        if size < 0 or size > len(self._buffer):
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def compressing_reader(raw: BinaryIO, codec: str) -> BinaryIO:
+    if codec == "gzip":
+        return GzipCompressingReader(raw)
+    if codec == "zstd":
+        return _import_zstandard().ZstdCompressor().stream_reader(raw)
+    raise ValueError(f"Unsupported codec: {codec} (expected one of {CODECS})")
+
+
+def decompressing_reader(raw: BinaryIO, codec: str | None) -> BinaryIO:
+    if codec is None:
+        return raw
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if codec == "zstd":
+        return _import_zstandard().ZstdDecompressor().stream_reader(raw)
+    raise ValueError(f"Unsupported codec: {codec} (expected one of {CODECS})")
+
+
+def object_codec(stat) -> str | None:
+    return stat.metadata.get(CODEC_METADATA_KEY)
@@ -3,6 +3,8 @@ from  pathlib import Path
 
 from dotenv import load_dotenv
 from minio import Minio
+from prefect.task_runners import ProcessPoolTaskRunner, TaskRunner, ThreadPoolTaskRunner
+from pyarrow.fs import S3FileSystem
 
 load_dotenv()
 
@@ -15,15 +17,50 @@ MINIO_SECURE = os.getenv("MINIO_SECURE", "False").lower() == "true"
 # Database configuration
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "./data/database/analytics.db")
 
+# Transfer configuration (MinIO requires parts of at least 5 MiB)
+MULTIPART_PART_SIZE = int(os.getenv("MULTIPART_PART_SIZE", str(64 * 1024 * 1024)))
+MULTIPART_PARALLEL_UPLOADS = int(os.getenv("MULTIPART_PARALLEL_UPLOADS", "4"))
+INGESTION_MAX_WORKERS = int(os.getenv("INGESTION_MAX_WORKERS", "8"))
+SILVER_CSV_BLOCK_SIZE = int(os.getenv("SILVER_CSV_BLOCK_SIZE", str(16 * 1024 * 1024)))
+SILVER_ROW_GROUP_SIZE = int(os.getenv("SILVER_ROW_GROUP_SIZE", str(128 * 1024)))
+# Rows buffered across the partitions of silver achats before the largest one is written
+SILVER_BUFFER_ROWS = int(os.getenv("SILVER_BUFFER_ROWS", str(1024 * 1024)))
+
+# Purchases aggregated at a time by the streaming gold aggregation
+GOLD_BATCH_ROWS = int(os.getenv("GOLD_BATCH_ROWS", str(1024 * 1024)))
+
+# Worker processes (and id_client shards) of the sharded gold aggregation
+GOLD_SHARD_WORKERS = int(os.getenv("GOLD_SHARD_WORKERS", str(os.cpu_count() or 1)))
+
+# Target relative error of the approximate (HyperLogLog) distinct-client counts
+HLL_RELATIVE_ERROR = float(os.getenv("HLL_RELATIVE_ERROR", "0.01"))
+# Same for the per-cell client sketches of the sales cube (2% -> 4 KiB per cell)
+CUBE_HLL_RELATIVE_ERROR = float(os.getenv("CUBE_HLL_RELATIVE_ERROR", "0.02"))
+
+# Threads of the embedded SQL engine used by the "sql" gold engine
+GOLD_SQL_THREADS = int(os.getenv("GOLD_SQL_THREADS", str(os.cpu_count() or 1)))
+
+# MongoDB bulk loads: documents per unordered insert batch, concurrent writer threads
+MONGODB_BATCH_SIZE = int(os.getenv("MONGODB_BATCH_SIZE", "5000"))
+MONGODB_WRITERS = int(os.getenv("MONGODB_WRITERS", "4"))
+
 # Prefect configuration
 PREFECT_API_URL = os.getenv("PREFECT_API_URL", "http://localhost:4200/api")
 
+# Task runner of the silver and gold flows: "thread" shares DataFrames between
+# tasks in memory, "process" pickles task inputs and results across processes
+TASK_RUNNER = os.getenv("TASK_RUNNER", "thread")
+TASK_RUNNER_MAX_WORKERS = int(os.getenv("TASK_RUNNER_MAX_WORKERS", "4"))
+
 # Buckets
 BUCKET_SOURCES = "sources"
 BUCKET_BRONZE = "bronze"
 BUCKET_SILVER = "silver"
 BUCKET_GOLD = "gold"
 
+# Manifest of ingested source files, stored in the bronze bucket
+BRONZE_MANIFEST = "_manifest.json"
+
 def get_minio_client() -> Minio:
     return Minio(
         MINIO_ENDPOINT,
@@ -32,6 +69,19 @@ def get_minio_client() -> Minio:
         secure = MINIO_SECURE
     )
 
+def get_arrow_filesystem() -> S3FileSystem:
+    return S3FileSystem(
+        access_key = MINIO_ACCESS_KEY,
+        secret_key = MINIO_SECRET_KEY,
+        endpoint_override = MINIO_ENDPOINT,
+        scheme = "https" if MINIO_SECURE else "http"
+    )
+
+def get_task_runner() -> TaskRunner:
+    if TASK_RUNNER == "process":
+        return ProcessPoolTaskRunner(max_workers=TASK_RUNNER_MAX_WORKERS)
+    return ThreadPoolTaskRunner(max_workers=TASK_RUNNER_MAX_WORKERS)
+
 def configure_prefect() -> None:
     os.environ["PREFECT_API_URL"] = PREFECT_API_URL
 
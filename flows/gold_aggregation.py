@@ -1,12 +1,70 @@
 from io import BytesIO
 
 import pandas as pd
+import pyarrow.parquet as pq
 from prefect import flow, task
+from prefect.cache_policies import NO_CACHE
+from sketches.hyperloglog import precision_for_error
 
-from config import BUCKET_GOLD, BUCKET_SILVER, get_minio_client
+from config import (
+    BUCKET_GOLD,
+    BUCKET_SILVER,
+    CUBE_HLL_RELATIVE_ERROR,
+    GOLD_SHARD_WORKERS,
+    HLL_RELATIVE_ERROR,
+    get_minio_client,
+    get_task_runner,
+)
+from gold_engine import (
+    SKETCH_PARTIALS,
+    GoldAccumulator,
+    base_aggregate,
+    client_sketches,
+    compute_cube,
+    compute_gold_tables,
+    compute_partials,
+    cube_from_cells,
+    tables_from_partials,
+)
+from gold_partials import (
+    delete_month_partials,
+    list_partial_months,
+    load_partials_state,
+    partials_path,
+    read_all_partials,
+    save_partials_state,
+    write_month_partials,
+)
+from gold_shards import sharded_partials
+from gold_sql import compute_gold_tables_sql
+from schemas import ACHATS_SILVER_SCHEMA
+from silver_dataset import (
+    achats_dataset_path,
+    achats_scan,
+    iter_achats_batches,
+    list_achats_partitions,
+    month_bounds,
+    read_achats_dataset,
+)
+from timing import timed
+
+# Colonnes d'achats utilisées par les agrégations gold
+ACHATS_GOLD_COLUMNS = ['id_achat', 'id_client', 'date_achat', 'montant', 'produit']
+
+# Moteurs de calcul des tables gold : pandas (défaut) ou SQL embarqué (DuckDB)
+GOLD_ENGINES = ("pandas", "sql")
+
+# Précision des sketches HyperLogLog du mode approximatif, et table gold où ils sont conservés
+HLL_PRECISION = precision_for_error(HLL_RELATIVE_ERROR)
+CLIENTS_SKETCHES = "clients_sketches"
+
+# Cube produit x pays x mois, toujours produit avec les tables gold
+CUBE_PRECISION = precision_for_error(CUBE_HLL_RELATIVE_ERROR)
+SALES_CUBE = "sales_cube"
 
 
 @task(name="read_silver_parquet", retries=2)
+@timed
 def read_silver_data(object_name: str) -> pd.DataFrame:
 
     client = get_minio_client()
@@ -16,81 +74,172 @@ def read_silver_data(object_name: str) -> pd.DataFrame:
     response.close()
     response.release_conn()
     
-    df = pd.read_parquet(BytesIO(data))
+    # Les types du schéma silver sont conservés (date32 -> datetime64 plutôt qu'objets date)
+    df = pq.read_table(BytesIO(data)).to_pandas(date_as_object=False)
     print(f"Read {len(df)} rows from silver/{object_name}")
     return df
 
 
-@task(name="aggregate_clients_stats", retries=2)
-def create_clients_stats(clients_df: pd.DataFrame, achats_df: pd.DataFrame) -> pd.DataFrame:
-    stats = achats_df.groupby('id_client').agg(
-        nombre_achats=('id_achat', 'count'),
-        montant_total=('montant', 'sum'),
-        montant_moyen=('montant', 'mean'),
-        premier_achat=('date_achat', 'min'),
-        dernier_achat=('date_achat', 'max')
-    ).reset_index()
-    
-    result = clients_df.merge(stats, on='id_client', how='left')
-    
-    result['nombre_achats'] = result['nombre_achats'].fillna(0).astype(int)
-    result['montant_total'] = result['montant_total'].fillna(0)
-    result['montant_moyen'] = result['montant_moyen'].fillna(0)
-    
-    print(f"Created stats for {len(result)} clients")
-    return result
-
-
-@task(name="aggregate_sales_by_product", retries=2)
-def create_product_stats(achats_df: pd.DataFrame) -> pd.DataFrame:
-    stats = achats_df.groupby('produit').agg(
-        nombre_ventes=('id_achat', 'count'),
-        chiffre_affaires=('montant', 'sum'),
-        prix_moyen=('montant', 'mean'),
-        prix_min=('montant', 'min'),
-        prix_max=('montant', 'max')
-    ).reset_index()
-    
-    # Tri par chiffre d'affaires décroissant
-    stats = stats.sort_values('chiffre_affaires', ascending=False)
+@task(name="read_silver_achats", retries=2)
+@timed
+def read_silver_achats(start_date: str | None = None, end_date: str | None = None) -> pd.DataFrame:
+    table = read_achats_dataset(start_date, end_date, columns=ACHATS_GOLD_COLUMNS)
+    df = table.to_pandas(date_as_object=False)
+    print(f"Read {len(df)} rows from {achats_dataset_path()}")
+    return df
+
+
+@task(name="aggregate_gold_tables", retries=2, cache_policy=NO_CACHE)
+@timed
+def aggregate_gold_tables(clients_df: pd.DataFrame, achats_df: pd.DataFrame, approximate: bool = False) -> dict:
+    # Réductions dans l'ordre des lignes d'achats : mêmes octets que les groupbys par table d'origine.
+    # Seuls le cube et les sketches passent par l'agrégat de base
+    base = base_aggregate(achats_df)
+    if approximate:
+        sketches = client_sketches(clients_df, base['mois_code'], base['id_client'], HLL_PRECISION)
+        tables = compute_gold_tables(clients_df, achats_df, sketches)
+        tables[CLIENTS_SKETCHES] = sketches
+    else:
+        tables = compute_gold_tables(clients_df, achats_df)
+    tables[SALES_CUBE] = compute_cube(clients_df, base, CUBE_PRECISION)
+    print("Created gold tables: " + ", ".join(f"{name} ({len(df)} rows)" for name, df in tables.items()))
+    return tables
+
+
+def empty_achats() -> pd.DataFrame:
+    # Aucun achat sur la période : mêmes tables, vides
+    return ACHATS_SILVER_SCHEMA.empty_table().select(ACHATS_GOLD_COLUMNS).to_pandas()
+
+
+def hll_precision(approximate: bool) -> int | None:
+    return HLL_PRECISION if approximate else None
+
+
+def rollup_partials(clients_df: pd.DataFrame, partials: dict | None, approximate: bool = False) -> dict:
+    if partials is None:
+        partials = compute_partials(clients_df, empty_achats(), CUBE_PRECISION, hll_precision(approximate))
+    if approximate:
+        # Sketches fusionnés des mois ou des shards : conservés avec les tables pour d'autres fusions
+        sketches = partials[SKETCH_PARTIALS]
+        tables = tables_from_partials(clients_df, partials, sketches)
+        tables[CLIENTS_SKETCHES] = sketches
+    else:
+        tables = tables_from_partials(clients_df, partials)
+    tables[SALES_CUBE] = cube_from_cells(partials["cells"])
+    return tables
+
+
+def partials_size(partials: dict | None) -> str:
+    if partials is None:
+        return "no partial rows"
+    return f"{len(partials['clients'])} client and {len(partials['cells'])} cell partial rows"
+
+
+@task(name="stream_gold_tables", retries=2, cache_policy=NO_CACHE)
+@timed
+def stream_gold_tables(
+    clients_df: pd.DataFrame,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    approximate: bool = False
+) -> dict:
+    # Les achats ne sont jamais chargés en entier : chaque lot est fusionné dans de petits accumulateurs.
+    # En mode approximatif, les sketches remplacent les ids de clients conservés pour chaque mois
+    accumulator = GoldAccumulator(clients_df, CUBE_PRECISION, hll_precision(approximate))
+    for table in iter_achats_batches(start_date, end_date, columns=ACHATS_GOLD_COLUMNS):
+        accumulator.add(table.to_pandas(date_as_object=False))
+    if accumulator.rows == 0:
+        accumulator.add(empty_achats())
+    print(f"Folded {accumulator.rows} purchases of {achats_dataset_path()} into {len(accumulator.clients)} client "
+          f"and {len(accumulator.cells)} cell totals")
     
-    print(f"Created stats for {len(stats)} products")
-    return stats
+    tables = accumulator.tables()
+    if approximate:
+        tables[CLIENTS_SKETCHES] = accumulator.sketches
+    tables[SALES_CUBE] = cube_from_cells(accumulator.cells)
+    return tables
+
+
+@task(name="aggregate_gold_sharded", retries=2, cache_policy=NO_CACHE)
+@timed
+def aggregate_gold_sharded(
+    clients_df: pd.DataFrame,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    approximate: bool = False
+) -> dict:
+    # Partiels calculés par GOLD_SHARD_WORKERS processus, chacun sur les clients de son shard.
+    # En mode approximatif, chaque shard produit ses sketches, unis ensuite comme les cellules
+    dataset, expression = achats_scan(start_date, end_date)
+    partials = sharded_partials(
+        dataset, achats_dataset_path(), expression, ACHATS_GOLD_COLUMNS, clients_df, CUBE_PRECISION,
+        GOLD_SHARD_WORKERS, sketch_precision=hll_precision(approximate)
+    )
+    print(f"Aggregated {achats_dataset_path()} on {GOLD_SHARD_WORKERS} processes into {partials_size(partials)}")
+    return rollup_partials(clients_df, partials, approximate)
+
 
+@task(name="aggregate_gold_tables_sql", retries=2)
+@timed
+def aggregate_gold_tables_sql(start_date: str | None = None, end_date: str | None = None) -> dict:
+    # Mêmes tables, calculées en SQL par DuckDB directement sur les fichiers Parquet silver
+    tables = compute_gold_tables_sql(start_date, end_date, CUBE_PRECISION)
+    print("Created gold tables with SQL: " + ", ".join(f"{name} ({len(df)} rows)" for name, df in tables.items()))
+    return tables
 
-@task(name="aggregate_sales_by_month", retries=2)
-def create_monthly_stats(achats_df: pd.DataFrame) -> pd.DataFrame:
-    achats_df['annee_mois'] = achats_df['date_achat'].dt.to_period('M').astype(str)
+
+@task(name="plan_gold_partials", retries=2)
+@timed
+def plan_gold_partials(approximate: bool = False) -> tuple[dict, list, list]:
+    """Compare the silver partitions and clients with those already aggregated into partials."""
+    partitions = list_achats_partitions()
+    clients_etag = get_minio_client().stat_object(BUCKET_SILVER, "clients.parquet").etag
+    state = load_partials_state()
+    months = state.get("months", {})
+    # Le pays des clients entre dans les cellules : un nouveau clients.parquet recalcule tous les mois
+    clients_changed = state.get("clients") != clients_etag
+    # En mode approximatif, un mois sans sketch (agrégé en mode exact) est aussi recalculé
+    sketched = list_partial_months(SKETCH_PARTIALS) if approximate else None
     
-    stats = achats_df.groupby('annee_mois').agg(
-        nombre_achats=('id_achat', 'count'),
-        chiffre_affaires=('montant', 'sum'),
-        panier_moyen=('montant', 'mean'),
-        nombre_clients_uniques=('id_client', 'nunique')
-    ).reset_index()
+    changed = [
+        month for month, files in partitions.items()
+        if clients_changed or months.get(month) != files or (approximate and month not in sketched)
+    ]
+    removed = [month for month in months if month not in partitions]
     
-    print(f"Created monthly stats for {len(stats)} months")
-    return stats
+    print(f"Partials: {len(changed)} months to refresh, {len(removed)} to remove, "
+          f"{len(partitions) - len(changed)} unchanged")
+    return {"clients": clients_etag, "months": partitions}, changed, removed
 
 
-@task(name="aggregate_sales_by_country", retries=2)
-def create_country_stats(clients_df: pd.DataFrame, achats_df: pd.DataFrame) -> pd.DataFrame:
-    data = achats_df.merge(clients_df[['id_client', 'pays']], on='id_client', how='left')
-    
-    stats = data.groupby('pays').agg(
-        nombre_clients=('id_client', 'nunique'),
-        nombre_achats=('id_achat', 'count'),
-        chiffre_affaires=('montant', 'sum'),
-        panier_moyen=('montant', 'mean')
-    ).reset_index()
+@task(name="refresh_month_partials", retries=2, cache_policy=NO_CACHE)
+@timed
+def refresh_month_partials(month: str, clients_df: pd.DataFrame, approximate: bool = False) -> str:
+    """Recompute the partials of one month, with its client sketches in approximate mode."""
+    client = get_minio_client()
     
-    stats = stats.sort_values('chiffre_affaires', ascending=False)
+    if not client.bucket_exists(BUCKET_GOLD):
+        client.make_bucket(BUCKET_GOLD)
     
-    print(f"Created stats for {len(stats)} countries")
-    return stats
+    start, end = month_bounds(month)
+    achats_df = read_achats_dataset(start, end, columns=ACHATS_GOLD_COLUMNS).to_pandas(date_as_object=False)
+    partials = compute_partials(clients_df, achats_df, CUBE_PRECISION, hll_precision(approximate))
+    write_month_partials(month, partials)
+    print(f"Aggregated {len(achats_df)} purchases of {month} into {partials_size(partials)}")
+    return month
+
 
+@task(name="aggregate_gold_from_partials", retries=2, cache_policy=NO_CACHE)
+@timed
+def aggregate_gold_from_partials(clients_df: pd.DataFrame, approximate: bool = False) -> dict:
+    partials = read_all_partials()
+    tables = rollup_partials(clients_df, partials, approximate)
+    print(f"Rolled up {partials_size(partials)} from {partials_path()}")
+    return tables
 
-@task(name="write_to_gold", retries=2)
+
+@task(name="write_to_gold", retries=2, cache_policy=NO_CACHE)
+@timed
 def write_to_gold(df: pd.DataFrame, object_name: str) -> str:
 
     client = get_minio_client()
@@ -114,27 +263,54 @@ def write_to_gold(df: pd.DataFrame, object_name: str) -> str:
     return object_name
 
 
-@flow(name="Gold Aggregation Flow")
-def gold_aggregation_flow() -> dict:
-    clients_df = read_silver_data("clients.parquet")
-    achats_df = read_silver_data("achats.parquet")
-    
-    clients_stats = create_clients_stats(clients_df, achats_df)
-    product_stats = create_product_stats(achats_df)
-    monthly_stats = create_monthly_stats(achats_df)
-    country_stats = create_country_stats(clients_df, achats_df)
+@flow(name="Gold Aggregation Flow", task_runner=get_task_runner())
+def gold_aggregation_flow(
+    start_date: str | None = None,
+    end_date: str | None = None,
+    incremental: bool = False,
+    engine: str = "pandas",
+    streaming: bool = False,
+    approximate: bool = False,
+    sharded: bool = False
+) -> dict:
+    if engine not in GOLD_ENGINES:
+        raise ValueError(f"Unknown gold engine {engine!r}, expected one of {GOLD_ENGINES}")
+    modes = [name for name, enabled in [("incremental", incremental), ("streaming", streaming), ("sharded", sharded)] if enabled]
+    if len(modes) > 1:
+        raise ValueError(f"Gold modes {modes} cannot be combined")
+    if engine == "sql" and (modes or approximate):
+        raise ValueError("Incremental, streaming, sharded and approximate modes require engine='pandas'")
     
-    gold_clients = write_to_gold(clients_stats, "clients_stats.parquet")
-    gold_products = write_to_gold(product_stats, "product_stats.parquet")
-    gold_monthly = write_to_gold(monthly_stats, "monthly_stats.parquet")
-    gold_country = write_to_gold(country_stats, "country_stats.parquet")
+    if engine == "sql":
+        tables = aggregate_gold_tables_sql.submit(start_date, end_date).result()
+    elif incremental:
+        if start_date or end_date:
+            raise ValueError("Incremental gold always covers the whole history; start_date/end_date are not supported")
+        # Les tâches indépendantes sont soumises au task runner et s'exécutent en parallèle
+        clients_df = read_silver_data.submit("clients.parquet")
+        # Seuls les mois dont les fichiers silver ont changé sont relus, les autres viennent des partiels
+        state, changed, removed = plan_gold_partials.submit(approximate).result()
+        refreshes = [refresh_month_partials.submit(month, clients_df, approximate) for month in changed]
+        for month in removed:
+            delete_month_partials(month)
+        tables = aggregate_gold_from_partials.submit(clients_df, approximate, wait_for=refreshes).result()
+        save_partials_state(state)
+    elif streaming:
+        clients_df = read_silver_data.submit("clients.parquet")
+        tables = stream_gold_tables.submit(clients_df, start_date, end_date, approximate).result()
+    elif sharded:
+        clients_df = read_silver_data.submit("clients.parquet")
+        tables = aggregate_gold_sharded.submit(clients_df, start_date, end_date, approximate).result()
+    else:
+        clients_df = read_silver_data.submit("clients.parquet")
+        achats_df = read_silver_achats.submit(start_date, end_date)
+        tables = aggregate_gold_tables.submit(clients_df, achats_df, approximate).result()
     
-    return {
-        "clients_stats": gold_clients,
-        "product_stats": gold_products,
-        "monthly_stats": gold_monthly,
-        "country_stats": gold_country
+    writes = {
+        name: write_to_gold.submit(df, f"{name}.parquet")
+        for name, df in tables.items()
     }
+    return {name: future.result() for name, future in writes.items()}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,455 @@
+import numpy as np
+import pandas as pd
+from sketches.hyperloglog import estimate, merge_registers, sketch_registers
+
+# Agrégat de base : une ligne par (mois, client, produit), calculé en une seule passe sur les achats
+BASE_KEYS = ['mois_code', 'id_client', 'produit']
+
+# Agrégats partiels fusionnables, clés par mois :
+# clients : (mois, client) -> nombre d'achats, montant total, premier et dernier achat
+# cellules : (mois, produit, pays) -> nombre, somme, min, max et sketch HyperLogLog des clients
+PARTIAL_KEYS = {
+    "clients": ['mois_code', 'id_client'],
+    "cells": ['mois_code', 'produit', 'pays'],
+}
+# Mode approximatif : sketches des clients par (mois, pays), fusionnés par union (cf. client_sketches)
+SKETCH_PARTIALS = "sketches"
+
+# Fusion de chaque colonne des agrégats partiels (lots, shards ou mois)
+MERGE_AGGREGATIONS = {
+    'nombre_achats': 'sum',
+    'montant_total': 'sum',
+    'chiffre_affaires': 'sum',
+    'montant_min': 'min',
+    'montant_max': 'max',
+    'premier_achat': 'min',
+    'dernier_achat': 'max',
+}
+
+
+def month_codes(dates: pd.Series) -> np.ndarray:
+    """Integer month key (annee * 12 + mois - 1): cheap to group on, sorts like 'YYYY-MM'."""
+    return dates.dt.year.to_numpy(dtype=np.int32) * 12 + dates.dt.month.to_numpy(dtype=np.int32) - 1
+
+
+def month_labels(codes: pd.Index) -> pd.Index:
+    # Même rendu que Period('M').astype(str), mais seulement pour les mois présents
+    labels = [f"{code // 12:04d}-{code % 12 + 1:02d}" for code in codes]
+    return pd.Index(labels, name='annee_mois').astype(str)
+
+
+def lookup_country(clients_df: pd.DataFrame, id_client: pd.Series) -> pd.Series:
+    """Country of each purchase through an integer-coded lookup instead of a row-level merge.
+
+    Purchases whose client is unknown get a missing country, as with a left merge.
+    """
+    country_codes, countries = pd.factorize(clients_df['pays'])
+    positions = pd.Index(clients_df['id_client']).get_indexer(id_client)
+    row_codes = np.where(positions >= 0, country_codes[positions], -1)
+    # Sans fill_value, take lirait -1 comme le dernier pays
+    return pd.Series(countries.take(row_codes, allow_fill=True, fill_value=np.nan), index=id_client.index, name='pays')
+
+
+def client_sketches(
+    clients_df: pd.DataFrame,
+    mois_code: np.ndarray | pd.Series,
+    id_client: pd.Series,
+    precision: int
+) -> pd.DataFrame:
+    """HyperLogLog sketch of the clients seen in each (month, country) pair.
+
+    Rows: mois_code, pays (missing for unknown clients), registres (bytes).
+    Sketches ignore duplicates, so they can be built from purchases or from partials.
+    """
+    keys = pd.DataFrame({
+        'mois_code': np.asarray(mois_code, dtype=np.int32),
+        'pays': lookup_country(clients_df, id_client).astype(object).to_numpy(),
+    })
+    grouped = keys.groupby(['mois_code', 'pays'], dropna=False, sort=True)
+    registers = sketch_registers(grouped.ngroup().to_numpy(), grouped.ngroups, id_client.to_numpy(), precision)
+
+    sketches = grouped.size().index.to_frame(index=False)
+    sketches['registres'] = [row.tobytes() for row in registers]
+    return sketches
+
+
+def sketch_matrix(sketches: pd.Series) -> np.ndarray:
+    if len(sketches) == 0:
+        # Aucun achat sur la période : pas de sketch, ni de précision à vérifier
+        return np.empty((0, 0), dtype=np.uint8)
+    sizes = sketches.str.len().unique()
+    if len(sizes) > 1:
+        raise ValueError(f"Cannot merge HyperLogLog sketches of different precisions (sizes {sorted(sizes)})")
+    return np.frombuffer(b"".join(sketches), dtype=np.uint8).reshape(len(sketches), -1)
+
+
+def merge_sketches(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Union of client sketches (e.g. of several shards or runs) per (month, country)."""
+    sketches = pd.concat(frames, ignore_index=True)
+    grouped = sketches.groupby(['mois_code', 'pays'], dropna=False, sort=True)
+    registers = merge_registers(grouped.ngroup().to_numpy(), grouped.ngroups, sketch_matrix(sketches['registres']))
+
+    merged = grouped.size().index.to_frame(index=False)
+    merged['registres'] = [row.tobytes() for row in registers]
+    return merged
+
+
+def distinct_clients(sketches: pd.DataFrame) -> tuple[pd.Series, pd.Series]:
+    """Estimated distinct clients per month code and per country."""
+    if sketches.empty:
+        return pd.Series(dtype='int64'), pd.Series(dtype='int64')
+    registers = sketch_matrix(sketches['registres'])
+
+    months, month_groups = np.unique(sketches['mois_code'].to_numpy(), return_inverse=True)
+    per_month = estimate(merge_registers(month_groups, len(months), registers))
+
+    known = sketches['pays'].notna().to_numpy()
+    countries, country_groups = np.unique(sketches['pays'][known].astype(str).to_numpy(), return_inverse=True)
+    per_country = estimate(merge_registers(country_groups, len(countries), registers[known]))
+
+    return pd.Series(per_month, index=months), pd.Series(per_country, index=countries)
+
+
+def set_distinct_clients(
+    monthly_stats: pd.DataFrame,
+    country_stats: pd.DataFrame,
+    sketches: pd.DataFrame
+) -> None:
+    # Estimations HyperLogLog à la place des nunique exacts, aux mêmes positions de colonnes
+    per_month, per_country = distinct_clients(sketches)
+    monthly_stats['nombre_clients_uniques'] = (
+        per_month.reindex(monthly_stats.index).fillna(0).astype('int64').to_numpy()
+    )
+    country_stats.insert(0, 'nombre_clients', (
+        per_country.reindex(country_stats.index.astype(str)).fillna(0).astype('int64').to_numpy()
+    ))
+
+
+def compute_gold_tables(
+    clients_df: pd.DataFrame,
+    achats_df: pd.DataFrame,
+    sketches: pd.DataFrame | None = None
+) -> dict:
+    """Compute clients_stats, product_stats, monthly_stats and country_stats from shared keys.
+
+    The grouping keys (month code, country) are derived once from the
+    purchases; each table is then a reduction over those keys. The float
+    reductions keep the purchases' row order, so results are bit-identical to
+    the per-table groupbys the flow used before. Neither input is modified.
+
+    With sketches (see client_sketches), the distinct-client columns are
+    HyperLogLog estimates instead of exact nunique counts.
+    """
+    # Clés partagées, calculées une seule fois sur les achats
+    month = pd.Series(month_codes(achats_df['date_achat']), index=achats_df.index, name='annee_mois')
+    country = lookup_country(clients_df, achats_df['id_client'])
+
+    per_client = achats_df.groupby('id_client').agg(
+        nombre_achats=('id_achat', 'count'),
+        montant_total=('montant', 'sum'),
+        montant_moyen=('montant', 'mean'),
+        premier_achat=('date_achat', 'min'),
+        dernier_achat=('date_achat', 'max')
+    ).reset_index()
+    clients_stats = clients_df.merge(per_client, on='id_client', how='left')
+    clients_stats['nombre_achats'] = clients_stats['nombre_achats'].fillna(0).astype(int)
+    clients_stats['montant_total'] = clients_stats['montant_total'].fillna(0)
+    clients_stats['montant_moyen'] = clients_stats['montant_moyen'].fillna(0)
+
+    product_stats = achats_df.groupby('produit', observed=True).agg(
+        nombre_ventes=('id_achat', 'count'),
+        chiffre_affaires=('montant', 'sum'),
+        prix_moyen=('montant', 'mean'),
+        prix_min=('montant', 'min'),
+        prix_max=('montant', 'max')
+    ).reset_index()
+    product_stats = product_stats.sort_values('chiffre_affaires', ascending=False)
+
+    # Avec des sketches, les nunique exacts sont remplacés par des estimations (set_distinct_clients)
+    exact = sketches is None
+    monthly_stats = achats_df.groupby(month).agg(
+        nombre_achats=('id_achat', 'count'),
+        chiffre_affaires=('montant', 'sum'),
+        panier_moyen=('montant', 'mean'),
+        **({'nombre_clients_uniques': ('id_client', 'nunique')} if exact else {})
+    )
+    country_stats = achats_df.groupby(country, observed=True).agg(
+        **({'nombre_clients': ('id_client', 'nunique')} if exact else {}),
+        nombre_achats=('id_achat', 'count'),
+        chiffre_affaires=('montant', 'sum'),
+        panier_moyen=('montant', 'mean')
+    )
+    if not exact:
+        set_distinct_clients(monthly_stats, country_stats, sketches)
+    monthly_stats.index = month_labels(monthly_stats.index)
+    monthly_stats = monthly_stats.reset_index()
+    country_stats = country_stats.reset_index().sort_values('chiffre_affaires', ascending=False)
+
+    return {
+        "clients_stats": clients_stats,
+        "product_stats": product_stats,
+        "monthly_stats": monthly_stats,
+        "country_stats": country_stats
+    }
+
+
+def base_aggregate(achats_df: pd.DataFrame) -> pd.DataFrame:
+    """Purchases grouped on (month, client, product): the only pass over the purchases.
+
+    Counts and sums add up, minimums and maximums combine: every gold table
+    and the partials are reductions of this aggregate.
+    """
+    month = pd.Series(month_codes(achats_df['date_achat']), index=achats_df.index, name='mois_code')
+
+    return achats_df.groupby([month, 'id_client', 'produit'], observed=True).agg(
+        nombre_achats=('id_achat', 'count'),
+        montant_total=('montant', 'sum'),
+        montant_min=('montant', 'min'),
+        montant_max=('montant', 'max'),
+        premier_achat=('date_achat', 'min'),
+        dernier_achat=('date_achat', 'max')
+    ).reset_index()
+
+
+def client_partials(base: pd.DataFrame, keys: list[str] = PARTIAL_KEYS["clients"]) -> pd.DataFrame:
+    """Per (month, client) totals: clients_stats and the exact distinct clients of each month.
+
+    With keys=['id_client'], totals per client over all the months.
+    """
+    return base.groupby(keys).agg(
+        nombre_achats=('nombre_achats', 'sum'),
+        montant_total=('montant_total', 'sum'),
+        premier_achat=('premier_achat', 'min'),
+        dernier_achat=('dernier_achat', 'max')
+    ).reset_index()
+
+
+def cell_partials(clients_df: pd.DataFrame, base: pd.DataFrame, precision: int | None = None) -> pd.DataFrame:
+    """Per (month, product, country) count, sum, min and max, plus a client sketch when precision is given.
+
+    Product, month and country totals are sums of cells; the sketches
+    (clients_sketch, bytes) union into the distinct clients of any slice.
+    Purchases of unknown clients get a missing country.
+    """
+    country = lookup_country(clients_df, base['id_client'])
+    grouped = base.groupby([base['mois_code'], base['produit'], country], observed=True, dropna=False)
+
+    cells = grouped.agg(
+        nombre_achats=('nombre_achats', 'sum'),
+        chiffre_affaires=('montant_total', 'sum'),
+        montant_min=('montant_min', 'min'),
+        montant_max=('montant_max', 'max')
+    )
+    if precision is not None:
+        registers = sketch_registers(grouped.ngroup().to_numpy(), grouped.ngroups, base['id_client'].to_numpy(), precision)
+        cells['clients_sketch'] = [row.tobytes() for row in registers]
+    return cells.reset_index()
+
+
+def compute_partials(
+    clients_df: pd.DataFrame,
+    achats_df: pd.DataFrame,
+    precision: int | None = None,
+    sketch_precision: int | None = None
+) -> dict:
+    """Mergeable partial aggregates of some purchases, keyed by month (see PARTIAL_KEYS).
+
+    Partials of disjoint sets of purchases (months, batches, shards) combine
+    with merge_partials; any set of months rolls up into the four gold tables
+    and the sales cube without the purchases. With sketch_precision, the
+    per (month, country) client sketches of the approximate mode are added.
+    """
+    base = base_aggregate(achats_df)
+    partials = {
+        "clients": client_partials(base),
+        "cells": cell_partials(clients_df, base, precision),
+    }
+    if sketch_precision is not None:
+        partials[SKETCH_PARTIALS] = client_sketches(clients_df, base['mois_code'], base['id_client'], sketch_precision)
+    return partials
+
+
+def merge_frames(frames: list[pd.DataFrame], keys: list[str]) -> pd.DataFrame:
+    """Combine partial rows sharing a key: sums add up, extremes combine, sketches are unioned."""
+    partials = pd.concat(frames, ignore_index=True)
+    # Les lots n'ont pas tous le même dictionnaire : concat retombe sur des chaînes
+    for column in ('produit', 'pays'):
+        if column in keys:
+            partials[column] = partials[column].astype('category')
+
+    grouped = partials.groupby(keys, observed=True, dropna=False)
+    merged = grouped.agg(**{
+        column: (column, MERGE_AGGREGATIONS[column])
+        for column in partials.columns if column in MERGE_AGGREGATIONS
+    })
+    if 'clients_sketch' in partials:
+        groups, sketches = grouped.ngroup().to_numpy(), sketch_matrix(partials['clients_sketch'])
+        registers = np.zeros((grouped.ngroups, sketches.shape[1]), dtype=np.uint8)
+        # Clés uniques dans chaque frame : un maximum vectorisé par frame, sans np.maximum.at
+        start = 0
+        for frame in frames:
+            rows, end = groups[start:start + len(frame)], start + len(frame)
+            registers[rows] = np.maximum(registers[rows], sketches[start:end])
+            start = end
+        merged['clients_sketch'] = [row.tobytes() for row in registers]
+    return merged.reset_index()
+
+
+def merge_partials(partials: list[dict]) -> dict:
+    """Combine the partials of disjoint sets of purchases (e.g. of several batches or shards)."""
+    merged = {name: merge_frames([p[name] for p in partials], keys) for name, keys in PARTIAL_KEYS.items()}
+    if SKETCH_PARTIALS in partials[0]:
+        merged[SKETCH_PARTIALS] = merge_sketches([p[SKETCH_PARTIALS] for p in partials])
+    return merged
+
+
+class GoldAccumulator:
+    """Running gold aggregates of a stream of purchase batches, one small accumulator per output.
+
+    - clients: totals per id_client (clients_stats, distinct clients per country)
+    - cells: (month, product, country) totals and client sketches (product,
+      month and country totals, sales cube)
+    - month_clients: sorted ids of the clients seen in each month (exact
+      distinct clients per month), or with sketch_precision, per (month,
+      country) HyperLogLog sketches of a fixed size instead
+
+    Each batch is aggregated on its own, then merged into these accumulators:
+    the cost of a batch depends on its size and on the number of clients and
+    cells, never on the purchases already folded.
+    """
+
+    def __init__(self, clients_df: pd.DataFrame, precision: int | None = None, sketch_precision: int | None = None):
+        self.clients_df = clients_df
+        self.precision = precision
+        self.sketch_precision = sketch_precision
+        self.clients = None
+        self.cells = None
+        self.month_clients = {}
+        self.sketches = None
+        self.rows = 0
+
+    def add(self, achats_df: pd.DataFrame) -> None:
+        base = base_aggregate(achats_df)
+        clients = client_partials(base, ['id_client'])
+        cells = cell_partials(self.clients_df, base, self.precision)
+        self.clients = clients if self.clients is None else merge_frames([self.clients, clients], ['id_client'])
+        self.cells = cells if self.cells is None else merge_frames([self.cells, cells], PARTIAL_KEYS["cells"])
+
+        if self.sketch_precision is not None:
+            sketches = client_sketches(self.clients_df, base['mois_code'], base['id_client'], self.sketch_precision)
+            self.sketches = sketches if self.sketches is None else merge_sketches([self.sketches, sketches])
+        else:
+            # Seuls les mois présents dans le lot sont fusionnés
+            for month, ids in base.groupby('mois_code')['id_client']:
+                seen = self.month_clients.get(month)
+                ids = ids.unique()
+                self.month_clients[month] = np.sort(ids) if seen is None else np.union1d(seen, ids)
+        self.rows += len(achats_df)
+
+    def tables(self) -> dict:
+        """The four gold tables of the purchases folded so far (at least one batch, possibly empty)."""
+        if self.sketches is not None:
+            return gold_tables(self.clients_df, self.clients, self.cells, sketches=self.sketches)
+        clients_per_month = pd.Series({month: len(ids) for month, ids in self.month_clients.items()}, dtype='int64')
+        return gold_tables(self.clients_df, self.clients, self.cells, clients_per_month, self.sketches)
+
+
+def cube_from_cells(cells: pd.DataFrame) -> pd.DataFrame:
+    """Rollup cube over (produit, pays, annee_mois): count, sum, min, max and a client sketch per cell.
+
+    Cells merge freely: counts and sums add up, extremes combine and the
+    HyperLogLog sketches (clients_sketch, bytes) are unioned, so any slice or
+    coarser grouping can be answered from the cube alone.
+    """
+    cube = cells.drop(columns='mois_code')
+    cube.insert(2, 'annee_mois', month_labels(pd.Index(cells['mois_code'])))
+    # Chaînes simples plutôt que catégories ; le pays d'un client inconnu reste nul (pas "nan")
+    for column in ('produit', 'pays'):
+        cube[column] = cube[column].astype(object).where(cube[column].notna(), None)
+    return cube.sort_values(['produit', 'pays', 'annee_mois'], ignore_index=True)
+
+
+def compute_cube(clients_df: pd.DataFrame, base: pd.DataFrame, precision: int) -> pd.DataFrame:
+    """Sales cube of a base aggregate (see base_aggregate)."""
+    return cube_from_cells(cell_partials(clients_df, base, precision))
+
+
+def tables_from_partials(
+    clients_df: pd.DataFrame,
+    partials: dict,
+    sketches: pd.DataFrame | None = None
+) -> dict:
+    """Roll partials up into the four gold tables.
+
+    clients_stats and the distinct clients come from the (month, client)
+    partials, the product, month and country totals from the cells. Means are
+    derived from sum / count, so they match a direct computation up to
+    floating-point summation order. With sketches, distinct clients are
+    HyperLogLog estimates.
+    """
+    client_rows = partials["clients"]
+    clients_per_month = client_rows.groupby('mois_code').size() if sketches is None else None
+    return gold_tables(clients_df, client_partials(client_rows, ['id_client']), partials["cells"], clients_per_month, sketches)
+
+
+def gold_tables(
+    clients_df: pd.DataFrame,
+    client_totals: pd.DataFrame,
+    cells: pd.DataFrame,
+    clients_per_month: pd.Series | None = None,
+    sketches: pd.DataFrame | None = None
+) -> dict:
+    """The four gold tables from totals per client and cells.
+
+    Distinct clients per month come from clients_per_month (indexed by month
+    code), per country from the clients with a purchase; with sketches, both
+    are HyperLogLog estimates instead.
+    """
+    per_client = client_totals.set_index('id_client')
+    per_client.insert(2, 'montant_moyen', per_client['montant_total'] / per_client['nombre_achats'])
+    clients_stats = clients_df.merge(per_client.reset_index(), on='id_client', how='left')
+    clients_stats['nombre_achats'] = clients_stats['nombre_achats'].fillna(0).astype(int)
+    clients_stats['montant_total'] = clients_stats['montant_total'].fillna(0)
+    clients_stats['montant_moyen'] = clients_stats['montant_moyen'].fillna(0)
+
+    product_stats = cells.groupby('produit', observed=True).agg(
+        nombre_ventes=('nombre_achats', 'sum'),
+        chiffre_affaires=('chiffre_affaires', 'sum'),
+        prix_min=('montant_min', 'min'),
+        prix_max=('montant_max', 'max')
+    )
+    product_stats.insert(2, 'prix_moyen', product_stats['chiffre_affaires'] / product_stats['nombre_ventes'])
+    product_stats = product_stats.reset_index().sort_values('chiffre_affaires', ascending=False)
+
+    monthly_stats = cells.groupby('mois_code').agg(
+        nombre_achats=('nombre_achats', 'sum'),
+        chiffre_affaires=('chiffre_affaires', 'sum')
+    )
+    monthly_stats['panier_moyen'] = monthly_stats['chiffre_affaires'] / monthly_stats['nombre_achats']
+
+    # Pays connu uniquement : les achats de clients inconnus sont exclus, comme avec un merge
+    country_stats = cells.groupby('pays', observed=True).agg(
+        nombre_achats=('nombre_achats', 'sum'),
+        chiffre_affaires=('chiffre_affaires', 'sum')
+    )
+    country_stats['panier_moyen'] = country_stats['chiffre_affaires'] / country_stats['nombre_achats']
+
+    if sketches is None:
+        monthly_stats['nombre_clients_uniques'] = clients_per_month.reindex(monthly_stats.index).fillna(0).astype('int64')
+        # Un client n'a qu'un pays : ses clients distincts sont ceux qui ont au moins un achat
+        client_countries = lookup_country(clients_df, per_client.index.to_series()).astype(str)
+        country_stats.insert(0, 'nombre_clients', (
+            client_countries.value_counts().reindex(country_stats.index.astype(str)).fillna(0).astype('int64').to_numpy()
+        ))
+    else:
+        set_distinct_clients(monthly_stats, country_stats, sketches)
+    monthly_stats.index = month_labels(monthly_stats.index)
+    monthly_stats = monthly_stats.reset_index()
+    country_stats = country_stats.reset_index().sort_values('chiffre_affaires', ascending=False)
+
+    return {
+        "clients_stats": clients_stats,
+        "product_stats": product_stats,
+        "monthly_stats": monthly_stats,
+        "country_stats": country_stats
+    }
@@ -0,0 +1,90 @@
+import json
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow.fs import FileSelector, FileType
+
+from config import BUCKET_GOLD, get_arrow_filesystem
+from gold_engine import SKETCH_PARTIALS
+from schemas import CELL_PARTIALS_SCHEMA, CLIENT_PARTIALS_SCHEMA, SKETCH_PARTIALS_SCHEMA
+
+# Agrégats partiels mensuels : gold/partials/clients/YYYY-MM.parquet, gold/partials/cells/YYYY-MM.parquet,
+# et gold/partials/sketches/YYYY-MM.parquet pour les mois agrégés en mode approximatif
+PARTIALS_PREFIX = "partials"
+PARTIALS_SCHEMAS = {
+    "clients": CLIENT_PARTIALS_SCHEMA,
+    "cells": CELL_PARTIALS_SCHEMA,
+    SKETCH_PARTIALS: SKETCH_PARTIALS_SCHEMA,
+}
+# Empreinte des entrées déjà agrégées (clients.parquet, et fichiers silver de chaque mois)
+PARTIALS_STATE = "_state.json"
+
+
+def partials_path() -> str:
+    return f"{BUCKET_GOLD}/{PARTIALS_PREFIX}"
+
+
+def load_partials_state() -> dict:
+    """State of the last run: {"clients": etag of clients.parquet, "months": month -> silver files}.
+
+    A state from an older partials layout is ignored, so every month is aggregated again.
+    """
+    filesystem = get_arrow_filesystem()
+    state_path = f"{partials_path()}/{PARTIALS_STATE}"
+
+    if filesystem.get_file_info(state_path).type == FileType.NotFound:
+        return {}
+    with filesystem.open_input_stream(state_path) as f:
+        state = json.loads(f.read())
+    return state if "months" in state else {}
+
+
+def save_partials_state(state: dict) -> None:
+    with get_arrow_filesystem().open_output_stream(f"{partials_path()}/{PARTIALS_STATE}") as f:
+        f.write(json.dumps(state, indent=2, sort_keys=True).encode("utf-8"))
+
+
+def write_month_partials(month: str, partials: dict) -> None:
+    """Replace the partials of one month; a kind missing from partials (e.g. sketches) is deleted, not kept stale."""
+    filesystem = get_arrow_filesystem()
+    for name, schema in PARTIALS_SCHEMAS.items():
+        if name not in partials:
+            delete_month_partials(month, [name])
+            continue
+        table = pa.Table.from_pandas(partials[name], schema=schema, preserve_index=False)
+        pq.write_table(table, f"{partials_path()}/{name}/{month}.parquet", filesystem=filesystem)
+
+
+def delete_month_partials(month: str, names: list[str] | None = None) -> None:
+    filesystem = get_arrow_filesystem()
+    for name in names or PARTIALS_SCHEMAS:
+        path = f"{partials_path()}/{name}/{month}.parquet"
+        if filesystem.get_file_info(path).type != FileType.NotFound:
+            filesystem.delete_file(path)
+
+
+def list_partial_months(name: str) -> set:
+    """Months with a partials file of the given kind."""
+    selector = FileSelector(f"{partials_path()}/{name}", allow_not_found=True)
+    return {
+        info.base_name.removesuffix(".parquet")
+        for info in get_arrow_filesystem().get_file_info(selector)
+        if info.type == FileType.File
+    }
+
+
+def read_all_partials() -> dict:
+    """Partials of every month; empty frames (with their columns) when none was written yet."""
+    filesystem = get_arrow_filesystem()
+    partials = {}
+    for name, schema in PARTIALS_SCHEMAS.items():
+        selector = FileSelector(f"{partials_path()}/{name}", allow_not_found=True)
+        paths = [info.path for info in filesystem.get_file_info(selector) if info.type == FileType.File]
+        if paths:
+            table = ds.dataset(paths, filesystem=filesystem, format="parquet", schema=schema).to_table()
+        else:
+            table = schema.empty_table()
+        partials[name] = table.to_pandas(date_as_object=False)
+    return partials
+
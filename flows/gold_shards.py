@@ -0,0 +1,157 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.ipc as ipc
+from pyarrow.fs import FileSystem
+from sketches.hyperloglog import hash_ids
+
+from gold_engine import compute_partials, merge_partials
+from schemas import ACHATS_SILVER_SCHEMA
+from silver_dataset import ACHATS_PARTITIONING
+
+# Fichiers Arrow IPC échangés entre processus (répertoire temporaire local)
+SHARD_FILE = "map-{mapper}-shard-{shard}.arrow"
+PARTIALS_FILE = "partials-shard-{shard}-{name}.arrow"
+CLIENTS_FILE = "clients.arrow"
+
+
+def shard_of(id_client: np.ndarray, nb_shards: int) -> np.ndarray:
+    # Hachage plutôt que modulo brut : les identifiants consécutifs se répartissent uniformément
+    return (hash_ids(id_client) % np.uint64(nb_shards)).astype(np.intp)
+
+
+def map_fragments(
+    paths: list[str],
+    filesystem: FileSystem,
+    base_dir: str,
+    expression: ds.Expression | None,
+    columns: list[str],
+    nb_shards: int,
+    work_dir: str,
+    mapper: int
+) -> int:
+    """Read some silver files and split their rows by id_client hash, one Arrow IPC stream per shard."""
+    dataset = ds.dataset(
+        paths,
+        filesystem=filesystem,
+        format="parquet",
+        partitioning=ACHATS_PARTITIONING,
+        partition_base_dir=base_dir,
+        schema=ACHATS_SILVER_SCHEMA
+    )
+    schema = pa.schema([ACHATS_SILVER_SCHEMA.field(column) for column in columns])
+    writers, sinks, rows = {}, [], 0
+
+    try:
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_readahead=1, fragment_readahead=1):
+            if batch.num_rows == 0:
+                continue
+            shards = shard_of(batch.column('id_client').to_numpy(), nb_shards)
+            # Un seul take par lot : les lignes sont regroupées par shard puis découpées en tranches
+            order = np.argsort(shards, kind='stable')
+            bounds = np.searchsorted(shards[order], np.arange(nb_shards + 1))
+            grouped = batch.take(pa.array(order))
+
+            for shard in range(nb_shards):
+                start, end = bounds[shard], bounds[shard + 1]
+                if start == end:
+                    continue
+                if shard not in writers:
+                    sink = pa.OSFile(os.path.join(work_dir, SHARD_FILE.format(mapper=mapper, shard=shard)), 'wb')
+                    sinks.append(sink)
+                    writers[shard] = ipc.new_stream(sink, schema)
+                writers[shard].write_batch(grouped.slice(start, end - start))
+            rows += batch.num_rows
+    finally:
+        for writer in writers.values():
+            writer.close()
+        for sink in sinks:
+            sink.close()
+    return rows
+
+
+def reduce_shard(
+    shard: int,
+    nb_mappers: int,
+    work_dir: str,
+    precision: int | None,
+    sketch_precision: int | None = None
+) -> dict | None:
+    """Partial aggregates of one shard, written as Arrow IPC files (name -> path). None if the shard is empty."""
+    tables = []
+    for mapper in range(nb_mappers):
+        path = os.path.join(work_dir, SHARD_FILE.format(mapper=mapper, shard=shard))
+        if os.path.exists(path):
+            # Lecture par memory map : pas de copie des buffers Arrow
+            tables.append(ipc.open_stream(pa.memory_map(path)).read_all())
+    if not tables:
+        return None
+
+    achats_df = pa.concat_tables(tables).to_pandas(date_as_object=False)
+    clients_df = ipc.open_file(pa.memory_map(os.path.join(work_dir, CLIENTS_FILE))).read_all().to_pandas(date_as_object=False)
+
+    paths = {}
+    for name, partials in compute_partials(clients_df, achats_df, precision, sketch_precision).items():
+        table = pa.Table.from_pandas(partials, preserve_index=False)
+        paths[name] = os.path.join(work_dir, PARTIALS_FILE.format(shard=shard, name=name))
+        with pa.OSFile(paths[name], 'wb') as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return paths
+
+
+def sharded_partials(
+    dataset: ds.FileSystemDataset,
+    base_dir: str,
+    expression: ds.Expression | None,
+    columns: list[str],
+    clients_df: pd.DataFrame,
+    precision: int | None,
+    workers: int,
+    nb_shards: int | None = None,
+    sketch_precision: int | None = None
+) -> dict | None:
+    """Partial aggregates (as compute_partials) computed by a pool of processes.
+
+    Map: each worker reads a share of the silver files and splits the rows by
+    id_client hash. Reduce: each shard holds every purchase of its clients,
+    so the client partials of different shards never share a key and only
+    the small (month, product, country) cells and, with sketch_precision, the
+    per (month, country) client sketches combine. Rows move between
+    processes as Arrow IPC files, never as pickled DataFrames. Returns None
+    when no purchase matches.
+    """
+    nb_shards = nb_shards or workers
+    paths = [fragment.path for fragment in dataset.get_fragments(filter=expression)]
+    if not paths:
+        return None
+    nb_mappers = min(workers, len(paths))
+
+    with tempfile.TemporaryDirectory(prefix="gold-shards-") as work_dir, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        clients = pa.Table.from_pandas(clients_df, preserve_index=False)
+        with pa.OSFile(os.path.join(work_dir, CLIENTS_FILE), 'wb') as sink, ipc.new_file(sink, clients.schema) as writer:
+            writer.write_table(clients)
+
+        maps = [
+            pool.submit(map_fragments, paths[mapper::nb_mappers], dataset.filesystem, base_dir,
+                        expression, columns, nb_shards, work_dir, mapper)
+            for mapper in range(nb_mappers)
+        ]
+        for future in maps:
+            future.result()
+
+        reduces = [pool.submit(reduce_shard, shard, nb_mappers, work_dir, precision, sketch_precision) for shard in range(nb_shards)]
+        results = [paths for paths in (future.result() for future in reduces) if paths is not None]
+        if not results:
+            return None
+
+        return merge_partials([
+            {name: ipc.open_file(pa.memory_map(path)).read_all().to_pandas(date_as_object=False) for name, path in paths.items()}
+            for paths in results
+        ])
@@ -0,0 +1,204 @@
+from datetime import datetime
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from config import BUCKET_SILVER, GOLD_SQL_THREADS, get_arrow_filesystem
+from gold_engine import compute_cube
+from schemas import ACHATS_SILVER_SCHEMA, CLIENTS_SILVER_SCHEMA
+from silver_dataset import ACHATS_PARTITIONING, achats_dataset_path
+
+# Seules ces colonnes sont lues dans les fichiers Parquet silver
+ACHATS_SQL = "SELECT id_achat, id_client, date_achat, montant, produit FROM achats_dataset"
+
+CLIENTS_STATS_SQL = """
+    WITH per_client AS (
+        SELECT
+            id_client,
+            count(id_achat) AS nombre_achats,
+            sum(montant) AS montant_total,
+            avg(montant) AS montant_moyen,
+            min(date_achat) AS premier_achat,
+            max(date_achat) AS dernier_achat
+        FROM achats
+        GROUP BY id_client
+    )
+    SELECT
+        c.id_client, c.nom, c.email, c.date_inscription, c.pays,
+        coalesce(p.nombre_achats, 0) AS nombre_achats,
+        coalesce(p.montant_total, 0) AS montant_total,
+        coalesce(p.montant_moyen, 0) AS montant_moyen,
+        p.premier_achat,
+        p.dernier_achat
+    FROM clients c
+    LEFT JOIN per_client p ON p.id_client = c.id_client
+    ORDER BY c.ordre
+"""
+
+PRODUCT_STATS_SQL = """
+    SELECT
+        produit,
+        count(id_achat) AS nombre_ventes,
+        sum(montant) AS chiffre_affaires,
+        avg(montant) AS prix_moyen,
+        min(montant) AS prix_min,
+        max(montant) AS prix_max
+    FROM achats
+    WHERE produit IS NOT NULL
+    GROUP BY produit
+    ORDER BY chiffre_affaires DESC
+"""
+
+# Regroupement sur le mois tronqué ; le libellé 'YYYY-MM' n'est formaté que pour les lignes du résultat
+MONTHLY_STATS_SQL = """
+    SELECT
+        strftime(mois, '%Y-%m') AS annee_mois,
+        nombre_achats,
+        chiffre_affaires,
+        panier_moyen,
+        nombre_clients_uniques
+    FROM (
+        SELECT
+            date_trunc('month', date_achat) AS mois,
+            count(id_achat) AS nombre_achats,
+            sum(montant) AS chiffre_affaires,
+            avg(montant) AS panier_moyen,
+            count(DISTINCT id_client) AS nombre_clients_uniques
+        FROM achats
+        WHERE date_achat IS NOT NULL
+        GROUP BY mois
+    )
+    ORDER BY annee_mois
+"""
+
+COUNTRY_STATS_SQL = """
+    SELECT
+        c.pays,
+        count(DISTINCT a.id_client) AS nombre_clients,
+        count(a.id_achat) AS nombre_achats,
+        sum(a.montant) AS chiffre_affaires,
+        avg(a.montant) AS panier_moyen
+    FROM achats a
+    JOIN clients c ON c.id_client = a.id_client
+    WHERE c.pays IS NOT NULL
+    GROUP BY c.pays
+    ORDER BY chiffre_affaires DESC
+"""
+
+# Agrégat de base (mois, client, produit), comme gold_engine.base_aggregate
+PARTIALS_SQL = """
+    SELECT
+        CAST(year(date_achat) * 12 + month(date_achat) - 1 AS INTEGER) AS mois_code,
+        id_client,
+        produit,
+        count(id_achat) AS nombre_achats,
+        sum(montant) AS montant_total,
+        min(montant) AS montant_min,
+        max(montant) AS montant_max,
+        min(date_achat) AS premier_achat,
+        max(date_achat) AS dernier_achat
+    FROM achats
+    WHERE date_achat IS NOT NULL
+    GROUP BY ALL
+"""
+
+GOLD_SQL = {
+    "clients_stats": CLIENTS_STATS_SQL,
+    "product_stats": PRODUCT_STATS_SQL,
+    "monthly_stats": MONTHLY_STATS_SQL,
+    "country_stats": COUNTRY_STATS_SQL,
+}
+
+
+def achats_where(start: datetime | None, end: datetime | None) -> tuple[str, dict]:
+    """WHERE clause on [start, end), with annee/mois bounds so that whole partitions are pruned."""
+    clauses, params = [], {}
+    if start is not None:
+        clauses.append("(annee > $start_year OR (annee = $start_year AND mois >= $start_month))")
+        clauses.append("date_achat >= CAST($start AS TIMESTAMP_MS)")
+        params.update(start=start, start_year=start.year, start_month=start.month)
+    if end is not None:
+        clauses.append("(annee < $end_year OR (annee = $end_year AND mois <= $end_month))")
+        clauses.append("date_achat < CAST($end AS TIMESTAMP_MS)")
+        params.update(end=end, end_year=end.year, end_month=end.month)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def read_clients_table() -> pa.Table:
+    # Petite dimension : lue entière, avec son ordre d'origine (même ordre de lignes que le merge pandas)
+    clients = ds.dataset(
+        f"{BUCKET_SILVER}/clients.parquet",
+        filesystem=get_arrow_filesystem(),
+        format="parquet",
+        schema=CLIENTS_SILVER_SCHEMA
+    ).to_table()
+    return clients.append_column('ordre', pa.array(np.arange(clients.num_rows)))
+
+
+def to_gold_frame(table: pa.Table) -> pd.DataFrame:
+    # DuckDB rend les colonnes dictionnaire en VARCHAR : on retrouve les catégories du chemin pandas
+    df = table.to_pandas(date_as_object=False)
+    for column in ('pays', 'produit'):
+        if column in df:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def run_gold_sql(
+    achats: ds.Dataset | pa.Table,
+    clients: pa.Table,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    cube_precision: int | None = None
+) -> dict:
+    """Run the four gold aggregations with DuckDB over Arrow achats and clients.
+
+    achats needs the silver columns plus annee/mois. With a dataset, DuckDB
+    pushes the projection and the filters down to the Parquet scan. With
+    cube_precision, the sales cube is added, built from partials computed in SQL.
+    """
+    with duckdb.connect() as con:
+        con.execute(f"SET threads = {GOLD_SQL_THREADS}")
+        con.register('achats_dataset', achats)
+        con.register('clients', clients)
+        # Achats matérialisés une fois (5 colonnes), puis partagés par les quatre requêtes
+        where, params = achats_where(start, end)
+        con.execute(f"CREATE TEMP TABLE achats AS {ACHATS_SQL}{where}", params)
+
+        tables = {
+            name: to_gold_frame(con.execute(query).to_arrow_table())
+            for name, query in GOLD_SQL.items()
+        }
+        if cube_precision is not None:
+            partials = to_gold_frame(con.execute(PARTIALS_SQL).to_arrow_table())
+            clients_df = to_gold_frame(clients.drop_columns(['ordre']))
+            tables["sales_cube"] = compute_cube(clients_df, partials, cube_precision)
+        return tables
+
+
+def compute_gold_tables_sql(
+    start: datetime | str | None = None,
+    end: datetime | str | None = None,
+    cube_precision: int | None = None
+) -> dict:
+    """Run the four gold aggregations as SQL directly over the silver Parquet files.
+
+    Only the needed columns, months and row groups are read (partition
+    pruning and date_achat statistics). Returns the same columns and dtypes
+    as compute_gold_tables; float sums may differ in the last bits because
+    DuckDB adds them in parallel.
+    """
+    start = pd.Timestamp(start).to_pydatetime() if start is not None else None
+    end = pd.Timestamp(end).to_pydatetime() if end is not None else None
+
+    achats_dataset = ds.dataset(
+        achats_dataset_path(),
+        filesystem=get_arrow_filesystem(),
+        format="parquet",
+        partitioning=ACHATS_PARTITIONING,
+        schema=ACHATS_SILVER_SCHEMA
+    )
+    return run_gold_sql(achats_dataset, read_clients_table(), start, end, cube_precision)
@@ -0,0 +1,46 @@
+from io import BytesIO
+
+import numpy as np
+
+
+class SortedIdIndex:
+    """Compact set of integer ids, stored as a sorted int64 array (8 bytes per id)."""
+
+    def __init__(self, ids: np.ndarray | None = None):
+        if ids is None:
+            self._ids = np.empty(0, dtype=np.int64)
+        else:
+            self._ids = np.unique(np.asarray(ids, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def copy(self) -> "SortedIdIndex":
+        # Le tableau n'est jamais modifié en place (add en crée un nouveau) : on peut le partager
+        index = SortedIdIndex()
+        index._ids = self._ids
+        return index
+
+    def to_bytes(self) -> bytes:
+        buffer = BytesIO()
+        np.save(buffer, self._ids, allow_pickle=False)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SortedIdIndex":
+        index = cls()
+        index._ids = np.load(BytesIO(data), allow_pickle=False)
+        return index
+
+    def contains(self, ids: np.ndarray) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self._ids, ids)
+        found = positions < len(self._ids)
+        found[found] = self._ids[positions[found]] == ids[found]
+        return found
+
+    def add(self, ids: np.ndarray) -> None:
+        new_ids = np.unique(np.asarray(ids, dtype=np.int64))
+        new_ids = new_ids[~self.contains(new_ids)]
+        # Insertion dans le tableau trié : O(n), sans re-tri complet
+        self._ids = np.insert(self._ids, np.searchsorted(self._ids, new_ids), new_ids)
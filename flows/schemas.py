@@ -0,0 +1,84 @@
+import pyarrow as pa
+
+# Formats des dates dans les CSV sources (cf. script/generate_data.py)
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Ordre de dt.dayofweek (lundi = 0)
+JOURS_SEMAINE = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Types pandas appliqués dès la lecture des CSV bronze (identifiants nullables : une ligne
+# bronze sans identifiant ne fait pas échouer la lecture, elle est écartée au nettoyage)
+CLIENTS_CSV_DTYPES = {
+    'id_client': 'Int32',
+    'nom': 'str',
+    'email': 'str',
+    'date_inscription': 'str',
+    'pays': 'category',
+}
+
+ACHATS_CSV_DTYPES = {
+    'id_achat': 'Int64',
+    'id_client': 'Int32',
+    'date_achat': 'str',
+    'montant': 'float64',
+    'produit': 'category',
+}
+
+# Même chose pour le lecteur CSV incrémental de pyarrow
+ACHATS_CSV_TYPES = {
+    'id_achat': pa.int64(),
+    'id_client': pa.int32(),
+    'date_achat': pa.string(),
+    'montant': pa.float64(),
+    'produit': pa.dictionary(pa.int32(), pa.string()),
+}
+
+# Schémas des tables silver (index de dictionnaire int16 : jusqu'à 32767 produits ou pays)
+CLIENTS_SILVER_SCHEMA = pa.schema([
+    ('id_client', pa.int32()),
+    ('nom', pa.string()),
+    ('email', pa.string()),
+    ('date_inscription', pa.timestamp('ms')),
+    ('pays', pa.dictionary(pa.int16(), pa.string())),
+])
+
+ACHATS_SILVER_SCHEMA = pa.schema([
+    ('id_achat', pa.int64()),
+    ('id_client', pa.int32()),
+    ('date_achat', pa.timestamp('ms')),
+    ('montant', pa.float64()),
+    ('produit', pa.dictionary(pa.int16(), pa.string())),
+    ('date', pa.date32()),
+    ('annee', pa.int16()),
+    ('mois', pa.int8()),
+    ('jour_semaine', pa.dictionary(pa.int8(), pa.string())),
+])
+
+# Agrégats partiels mensuels du gold incrémental (cf. gold_engine.compute_partials)
+CLIENT_PARTIALS_SCHEMA = pa.schema([
+    ('mois_code', pa.int32()),
+    ('id_client', pa.int32()),
+    ('nombre_achats', pa.int64()),
+    ('montant_total', pa.float64()),
+    ('premier_achat', pa.timestamp('ms')),
+    ('dernier_achat', pa.timestamp('ms')),
+])
+
+CELL_PARTIALS_SCHEMA = pa.schema([
+    ('mois_code', pa.int32()),
+    ('produit', pa.dictionary(pa.int16(), pa.string())),
+    ('pays', pa.dictionary(pa.int16(), pa.string())),
+    ('nombre_achats', pa.int64()),
+    ('chiffre_affaires', pa.float64()),
+    ('montant_min', pa.float64()),
+    ('montant_max', pa.float64()),
+    ('clients_sketch', pa.binary()),
+])
+
+# Mode approximatif : sketch HyperLogLog des clients par (mois, pays) (cf. gold_engine.client_sketches)
+SKETCH_PARTIALS_SCHEMA = pa.schema([
+    ('mois_code', pa.int32()),
+    ('pays', pa.string()),
+    ('registres', pa.binary()),
+])
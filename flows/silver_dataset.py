@@ -0,0 +1,279 @@
+import json
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow.fs import FileSelector, FileType
+
+from config import (
+    BUCKET_SILVER,
+    GOLD_BATCH_ROWS,
+    SILVER_BUFFER_ROWS,
+    SILVER_ROW_GROUP_SIZE,
+    get_arrow_filesystem,
+)
+from id_index import SortedIdIndex
+from schemas import ACHATS_SILVER_SCHEMA
+
+# Dataset achats partitionné à la Hive : silver/achats/annee=YYYY/mois=M/*.parquet
+ACHATS_DATASET = "achats"
+ACHATS_PARTITIONING = ds.partitioning(
+    pa.schema([
+        ACHATS_SILVER_SCHEMA.field('annee'),
+        ACHATS_SILVER_SCHEMA.field('mois'),
+    ]),
+    flavor="hive"
+)
+
+# État du traitement incrémental, rangé à côté des données (préfixe "_" ignoré par ds.dataset)
+ACHATS_ID_INDEX = "_id_index.npy"
+ACHATS_STATE = "_state.json"
+
+# Une réécriture complète produit une nouvelle génération (silver/achats/v<horodatage>/) ;
+# ce pointeur désigne la génération publiée, il est remplacé en une seule écriture
+ACHATS_CURRENT = "_current"
+
+
+def achats_root() -> str:
+    return f"{BUCKET_SILVER}/{ACHATS_DATASET}"
+
+
+def achats_dataset_path() -> str:
+    """Path of the published generation of the achats dataset (the dataset root before the first swap)."""
+    filesystem = get_arrow_filesystem()
+    pointer = f"{achats_root()}/{ACHATS_CURRENT}"
+
+    if filesystem.get_file_info(pointer).type == FileType.NotFound:
+        return achats_root()
+    with filesystem.open_input_stream(pointer) as f:
+        return f"{achats_root()}/{f.read().decode('utf-8').strip()}"
+
+
+def staging_achats_path() -> str:
+    """Path of a new, empty generation; readers don't see it until publish_achats_dataset."""
+    return f"{achats_root()}/v{datetime.now().strftime('%Y%m%dT%H%M%S%f')}"
+
+
+def publish_achats_dataset(path: str) -> None:
+    """Swap readers over to the generation at path, then delete the older generations.
+
+    The generation published until now is kept, so that a reader which resolved
+    it just before the swap can finish its scan.
+    """
+    filesystem = get_arrow_filesystem()
+    previous = achats_dataset_path()
+    pointer = f"{achats_root()}/{ACHATS_CURRENT}"
+
+    with filesystem.open_output_stream(pointer) as f:
+        f.write(path.rsplit("/", 1)[1].encode("utf-8"))
+
+    # Générations abandonnées (run interrompu) et ancienne disposition à la racine
+    for info in filesystem.get_file_info(FileSelector(achats_root(), allow_not_found=True)):
+        if info.path in (path, previous, pointer):
+            continue
+        if info.type == FileType.Directory:
+            filesystem.delete_dir(info.path)
+        else:
+            filesystem.delete_file(info.path)
+
+
+def load_achats_state(path: str | None = None) -> tuple[SortedIdIndex, dict]:
+    """Return the index of every id_achat already accepted and the bronze objects (name -> etag) processed."""
+    filesystem = get_arrow_filesystem()
+    path = path or achats_dataset_path()
+    state_path = f"{path}/{ACHATS_STATE}"
+
+    if filesystem.get_file_info(state_path).type == FileType.NotFound:
+        return SortedIdIndex(), {}
+
+    with filesystem.open_input_stream(state_path) as f:
+        processed = json.loads(f.read())
+    with filesystem.open_input_stream(f"{path}/{ACHATS_ID_INDEX}") as f:
+        seen_ids = SortedIdIndex.from_bytes(f.read())
+    return seen_ids, processed
+
+
+def save_achats_state(seen_ids: SortedIdIndex, processed: dict, path: str | None = None) -> None:
+    filesystem = get_arrow_filesystem()
+    path = path or achats_dataset_path()
+
+    # L'index d'abord : l'état n'est publié qu'une fois l'index complet
+    with filesystem.open_output_stream(f"{path}/{ACHATS_ID_INDEX}") as f:
+        f.write(seen_ids.to_bytes())
+    with filesystem.open_output_stream(f"{path}/{ACHATS_STATE}") as f:
+        f.write(json.dumps(processed, indent=2, sort_keys=True).encode("utf-8"))
+
+
+def write_achats_dataset(
+    table: pa.Table,
+    basename_template: str = "part-{i}.parquet",
+    path: str | None = None
+) -> None:
+    """Append a table to the achats dataset, one directory per (annee, mois).
+
+    Rows are sorted by date_achat so that row group statistics give tight
+    date ranges. Files whose name already exists in a partition are overwritten.
+    """
+    if table.num_rows == 0:
+        return
+
+    table = table.sort_by([('annee', 'ascending'), ('mois', 'ascending'), ('date_achat', 'ascending')])
+    file_format = ds.ParquetFileFormat()
+
+    ds.write_dataset(
+        table,
+        path or achats_dataset_path(),
+        filesystem=get_arrow_filesystem(),
+        format=file_format,
+        partitioning=ACHATS_PARTITIONING,
+        basename_template=basename_template,
+        existing_data_behavior="overwrite_or_ignore",
+        file_options=file_format.make_write_options(write_statistics=True),
+        max_rows_per_group=SILVER_ROW_GROUP_SIZE,
+        min_rows_per_group=min(SILVER_ROW_GROUP_SIZE, table.num_rows)
+    )
+
+
+class PartitionBuffer:
+    """Collect achats rows per (annee, mois) partition and write each partition in large files.
+
+    When more than max_rows rows are buffered, the largest partition is written
+    out, so memory stays bounded whatever the order of the input rows. File
+    names only depend on the input, a retry rewrites the same files.
+    """
+
+    def __init__(self, path: str, basename_prefix: str = "part", max_rows: int = SILVER_BUFFER_ROWS):
+        self.path = path
+        self.basename_prefix = basename_prefix
+        self.max_rows = max_rows
+        self.partitions = {}
+        self.num_rows = 0
+        self.files = 0
+
+    def append(self, df: pd.DataFrame) -> None:
+        for key, part in df.groupby(['annee', 'mois'], sort=False, observed=True):
+            self.partitions.setdefault(key, []).append(
+                pa.Table.from_pandas(part, schema=ACHATS_SILVER_SCHEMA, preserve_index=False)
+            )
+            self.num_rows += len(part)
+        while self.num_rows > self.max_rows:
+            self.flush(max(self.partitions, key=lambda k: sum(t.num_rows for t in self.partitions[k])))
+
+    def flush(self, key: tuple | None = None) -> None:
+        """Write one partition, or every buffered partition when key is None."""
+        for key in [key] if key is not None else sorted(self.partitions):
+            table = pa.concat_tables(self.partitions.pop(key))
+            write_achats_dataset(table, f"{self.basename_prefix}-{self.files}-{{i}}.parquet", self.path)
+            self.num_rows -= table.num_rows
+            self.files += 1
+
+
+def list_achats_partitions() -> dict:
+    """Map each month of the dataset ('YYYY-MM') to a fingerprint of its files (name, size, mtime).
+
+    The fingerprint changes whenever rows are written to or removed from that month.
+    """
+    selector = FileSelector(achats_dataset_path(), allow_not_found=True, recursive=True)
+    partitions = {}
+    for info in get_arrow_filesystem().get_file_info(selector):
+        if info.type != FileType.File or info.base_name.startswith(("_", ".")):
+            continue
+        keys = dict(part.split("=", 1) for part in info.path.split("/") if "=" in part)
+        month = f"{int(keys['annee']):04d}-{int(keys['mois']):02d}"
+        mtime = info.mtime.isoformat() if info.mtime else None
+        partitions.setdefault(month, []).append([info.base_name, info.size, mtime])
+    return {month: sorted(files) for month, files in sorted(partitions.items())}
+
+
+def month_bounds(month: str) -> tuple[datetime, datetime]:
+    """First instant of the month 'YYYY-MM' and of the following month."""
+    start = datetime.strptime(month, "%Y-%m")
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def month_range_filter(start: datetime | None, end: datetime | None) -> ds.Expression | None:
+    """Filter on the annee/mois partition keys only, used to prune whole directories."""
+    annee, mois = ds.field('annee'), ds.field('mois')
+    expression = None
+    if start is not None:
+        expression = (annee > start.year) | ((annee == start.year) & (mois >= start.month))
+    if end is not None:
+        before_end = (annee < end.year) | ((annee == end.year) & (mois <= end.month))
+        expression = before_end if expression is None else expression & before_end
+    return expression
+
+
+def achats_scan(start: datetime | str | None, end: datetime | str | None) -> tuple[ds.Dataset, ds.Expression | None]:
+    """Achats dataset and the filter selecting date_achat in [start, end).
+
+    Partitions outside the range are skipped from their path, row groups from
+    their date_achat statistics.
+    """
+    start = pd.Timestamp(start).to_pydatetime() if start is not None else None
+    end = pd.Timestamp(end).to_pydatetime() if end is not None else None
+
+    dataset = ds.dataset(
+        achats_dataset_path(),
+        filesystem=get_arrow_filesystem(),
+        format="parquet",
+        partitioning=ACHATS_PARTITIONING,
+        schema=ACHATS_SILVER_SCHEMA
+    )
+
+    date_type = ACHATS_SILVER_SCHEMA.field('date_achat').type
+    expression = month_range_filter(start, end)
+    if start is not None:
+        expression &= ds.field('date_achat') >= pa.scalar(start, type=date_type)
+    if end is not None:
+        expression &= ds.field('date_achat') < pa.scalar(end, type=date_type)
+
+    return dataset, expression
+
+
+def read_achats_dataset(
+    start: datetime | str | None = None,
+    end: datetime | str | None = None,
+    columns: list[str] | None = None
+) -> pa.Table:
+    """Read silver achats with date_achat in [start, end), reading only the needed months and columns."""
+    dataset, expression = achats_scan(start, end)
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+def rebatch(batches: Iterable[pa.RecordBatch], batch_rows: int) -> Iterator[pa.Table]:
+    """Group record batches (typically one per row group) into tables of at least batch_rows rows."""
+    pending, pending_rows = [], 0
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows >= batch_rows:
+            yield pa.Table.from_batches(pending)
+            pending, pending_rows = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending)
+
+
+def iter_achats_batches(
+    start: datetime | str | None = None,
+    end: datetime | str | None = None,
+    columns: list[str] | None = None,
+    batch_rows: int = GOLD_BATCH_ROWS
+) -> Iterator[pa.Table]:
+    """Same rows as read_achats_dataset, as successive tables of about batch_rows rows.
+
+    Row groups are read one after the other (no read-ahead beyond the next
+    one), so memory depends on batch_rows and not on the size of the dataset.
+    """
+    dataset, expression = achats_scan(start, end)
+    batches = dataset.to_batches(
+        columns=columns,
+        filter=expression,
+        batch_readahead=1,
+        fragment_readahead=1
+    )
+    return rebatch(batches, batch_rows)
@@ -1,29 +1,92 @@
 from io import BytesIO
+from pathlib import Path
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from prefect import flow, task
+from prefect.cache_policies import NO_CACHE
 
-from config import BUCKET_BRONZE, BUCKET_SILVER, get_minio_client
+from compression import decompressing_reader, object_codec
+from config import (
+    BUCKET_BRONZE,
+    BUCKET_SILVER,
+    SILVER_CSV_BLOCK_SIZE,
+    get_minio_client,
+    get_task_runner,
+)
+from id_index import SortedIdIndex
+from silver_dataset import (
+    PartitionBuffer,
+    achats_dataset_path,
+    load_achats_state,
+    publish_achats_dataset,
+    save_achats_state,
+    staging_achats_path,
+    write_achats_dataset,
+)
+from timing import timed
+from schemas import (
+    ACHATS_CSV_DTYPES,
+    ACHATS_CSV_TYPES,
+    ACHATS_SILVER_SCHEMA,
+    CLIENTS_CSV_DTYPES,
+    CLIENTS_SILVER_SCHEMA,
+    DATE_FORMAT,
+    DATETIME_FORMAT,
+    JOURS_SEMAINE,
+)
+
+# Objets bronze d'achats : achats.csv, achats_2024-06-01.csv, ...
+ACHATS_BRONZE_PREFIX = "achats"
+
+# Identifiants obligatoires d'un achat (dédoublonnage et jointure client)
+ACHATS_ID_COLUMNS = ['id_achat', 'id_client']
+
+
+@task(name="list_bronze_achats", retries=2)
+@timed
+def list_bronze_achats() -> dict:
+    client = get_minio_client()
+    
+    objects = client.list_objects(BUCKET_BRONZE, prefix=ACHATS_BRONZE_PREFIX)
+    return {
+        obj.object_name: obj.etag
+        for obj in sorted(objects, key=lambda o: o.object_name)
+        if obj.object_name.endswith(".csv")
+    }
 
 
 @task(name="read_bronze_csv", retries=2)
-def read_bronze_data(object_name: str) -> pd.DataFrame:
+@timed
+def read_bronze_data(object_name: str, dtype: dict | None = None) -> pd.DataFrame:
     client = get_minio_client()
     
+    codec = object_codec(client.stat_object(BUCKET_BRONZE, object_name))
     response = client.get_object(BUCKET_BRONZE, object_name)
-    data = response.read()
-    response.close()
-    response.release_conn()
+    try:
+        # Lecture en flux : l'objet (compressé ou non) n'est jamais chargé en entier
+        df = pd.read_csv(decompressing_reader(response, codec), dtype=dtype)
+    finally:
+        response.close()
+        response.release_conn()
     
-    df = pd.read_csv(BytesIO(data))
     print(f"Read {len(df)} rows from bronze/{object_name}")
     return df
 
 
-@task(name="clean_clients", retries=2)
+def drop_missing_ids(df: pd.DataFrame, schema: pa.Schema, columns: list[str]) -> pd.DataFrame:
+    """Drop the rows without an identifier, then restore the non-nullable silver integer types."""
+    df = df.dropna(subset=columns)
+    return df.astype({column: schema.field(column).type.to_pandas_dtype() for column in columns})
+
+
+@task(name="clean_clients", retries=2, cache_policy=NO_CACHE)
+@timed
 def clean_clients_data(df: pd.DataFrame) -> pd.DataFrame:
-    df_clean = df.drop_duplicates(subset=['id_client'])
-    df_clean['date_inscription'] = pd.to_datetime(df_clean['date_inscription'])
+    df_clean = drop_missing_ids(df, CLIENTS_SILVER_SCHEMA, ['id_client']).drop_duplicates(subset=['id_client'])
+    df_clean['date_inscription'] = pd.to_datetime(df_clean['date_inscription'], format=DATE_FORMAT)
     df_clean['email'] = df_clean['email'].str.lower().str.strip()
     df_clean = df_clean.dropna()
     
@@ -31,30 +94,62 @@ def clean_clients_data(df: pd.DataFrame) -> pd.DataFrame:
     return df_clean
 
 
-@task(name="clean_achats", retries=2)
+def transform_achats(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """Date parsing, montant filter and derived columns, applied after deduplication."""
+    df_clean['date_achat'] = pd.to_datetime(df_clean['date_achat'], format=DATETIME_FORMAT)
+    df_clean = df_clean[(df_clean['montant'] > 0) & df_clean['date_achat'].notna()]
+    # date reste en datetime64 (minuit) en mémoire, écrite en date32 dans le Parquet
+    df_clean['date'] = df_clean['date_achat'].dt.normalize()
+    df_clean['annee'] = df_clean['date_achat'].dt.year.astype('int16')
+    df_clean['mois'] = df_clean['date_achat'].dt.month.astype('int8')
+    df_clean['jour_semaine'] = pd.Categorical.from_codes(
+        df_clean['date_achat'].dt.dayofweek,
+        categories=JOURS_SEMAINE
+    )
+    return df_clean.dropna()
+
+
+@task(name="dedupe_bronze_achats", retries=2, cache_policy=NO_CACHE)
+@timed
+def dedupe_bronze_achats(frames: list[pd.DataFrame]) -> tuple[pd.DataFrame, SortedIdIndex]:
+    """Concatenate bronze achats objects, dropping the id_achat already seen in an earlier object.
+
+    Same rule as the streaming and incremental modes: objects in name order,
+    first occurrence wins. Returns the rows and the id_achat index to save.
+    """
+    seen_ids = SortedIdIndex()
+    kept = []
+    for df in frames:
+        df = drop_missing_ids(df, ACHATS_SILVER_SCHEMA, ACHATS_ID_COLUMNS).drop_duplicates(subset=['id_achat'])
+        df = df[~seen_ids.contains(df['id_achat'].to_numpy())]
+        seen_ids.add(df['id_achat'].to_numpy())
+        kept.append(df)
+    
+    achats_df = pd.concat(kept, ignore_index=True)
+    print(f"Deduplicated {len(frames)} bronze achats objects: {sum(len(df) for df in frames)} -> {len(achats_df)} rows")
+    return achats_df, seen_ids
+
+
+@task(name="clean_achats", retries=2, cache_policy=NO_CACHE)
+@timed
 def clean_achats_data(df: pd.DataFrame) -> pd.DataFrame:
-    df_clean = df.drop_duplicates(subset=['id_achat'])
-    df_clean['date_achat'] = pd.to_datetime(df_clean['date_achat'])
-    df_clean = df_clean[df_clean['montant'] > 0]
-    df_clean['date'] = df_clean['date_achat'].dt.date
-    df_clean['annee'] = df_clean['date_achat'].dt.year
-    df_clean['mois'] = df_clean['date_achat'].dt.month
-    df_clean['jour_semaine'] = df_clean['date_achat'].dt.day_name()
-    df_clean = df_clean.dropna()
+    df_clean = drop_missing_ids(df, ACHATS_SILVER_SCHEMA, ACHATS_ID_COLUMNS).drop_duplicates(subset=['id_achat'])
+    df_clean = transform_achats(df_clean)
     
     print(f"Cleaned achats: {len(df)} -> {len(df_clean)} rows")
     return df_clean
 
 
-@task(name="write_to_silver", retries=2)
-def write_to_silver(df: pd.DataFrame, object_name: str) -> str:
+@task(name="write_to_silver", retries=2, cache_policy=NO_CACHE)
+@timed
+def write_to_silver(df: pd.DataFrame, object_name: str, schema: pa.Schema | None = None) -> str:
     client = get_minio_client()
     
     if not client.bucket_exists(BUCKET_SILVER):
         client.make_bucket(BUCKET_SILVER)
     
     buffer = BytesIO()
-    df.to_parquet(buffer, index=False, engine='pyarrow')
+    pq.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False), buffer)
     buffer.seek(0)
     
     client.put_object(
@@ -69,19 +164,159 @@ def write_to_silver(df: pd.DataFrame, object_name: str) -> str:
     return object_name
 
 
-@flow(name="Silver Transformation Flow")
-def silver_transformation_flow() -> dict:
-    clients_df = read_bronze_data("clients.csv")
-    clients_clean = clean_clients_data(clients_df)
-    clients_silver = write_to_silver(clients_clean, "clients.parquet")
+@task(name="write_achats_to_silver", retries=2, cache_policy=NO_CACHE)
+@timed
+def write_achats_to_silver(df: pd.DataFrame, dataset_path: str) -> str:
+    client = get_minio_client()
+    
+    if not client.bucket_exists(BUCKET_SILVER):
+        client.make_bucket(BUCKET_SILVER)
+    
+    write_achats_dataset(
+        pa.Table.from_pandas(df, schema=ACHATS_SILVER_SCHEMA, preserve_index=False),
+        path=dataset_path
+    )
+    
+    print(f"Wrote {len(df)} rows to {dataset_path}")
+    return dataset_path
+
+
+@task(name="load_silver_achats_state", retries=2)
+@timed
+def load_silver_achats_state(dataset_path: str) -> tuple[SortedIdIndex, dict]:
+    seen_ids, processed = load_achats_state(dataset_path)
+    print(f"Loaded id_achat index with {len(seen_ids)} ids, {len(processed)} bronze objects processed")
+    return seen_ids, processed
+
+
+@task(name="save_silver_achats_state", retries=2, cache_policy=NO_CACHE)
+@timed
+def save_silver_achats_state(seen_ids: SortedIdIndex, processed: dict, dataset_path: str) -> str:
+    save_achats_state(seen_ids, processed, dataset_path)
+    print(f"Saved id_achat index with {len(seen_ids)} ids, {len(processed)} bronze objects processed")
+    return dataset_path
+
+
+@task(name="publish_silver_achats", retries=2)
+@timed
+def publish_silver_achats(dataset_path: str) -> str:
+    # Les lecteurs passent de l'ancienne à la nouvelle génération sans jamais voir un dataset vide
+    publish_achats_dataset(dataset_path)
+    print(f"Published {dataset_path}")
+    return dataset_path
+
+
+@task(name="stream_achats_to_silver", retries=2, cache_policy=NO_CACHE)
+@timed
+def stream_achats_to_silver(
+    object_name: str,
+    seen_ids: SortedIdIndex,
+    dataset_path: str,
+    basename_prefix: str = "part",
+    block_size: int = SILVER_CSV_BLOCK_SIZE
+) -> SortedIdIndex:
+    """Clean one bronze achats object batch by batch and append its rows to the silver achats dataset.
+
+    Rows whose id_achat is already in seen_ids are dropped. Returns the index
+    extended with the ids of this object; seen_ids itself is left untouched so a
+    retry starts again from the same state (and rewrites the same file names).
+    Peak memory is bounded by block_size, the partition buffer (SILVER_BUFFER_ROWS)
+    and the index (8 bytes per id).
+    """
+    client = get_minio_client()
+    
+    if not client.bucket_exists(BUCKET_SILVER):
+        client.make_bucket(BUCKET_SILVER)
+    
+    codec = object_codec(client.stat_object(BUCKET_BRONZE, object_name))
+    response = client.get_object(BUCKET_BRONZE, object_name)
+    seen_ids = seen_ids.copy()
+    # Les lots sont regroupés par mois avant écriture : peu de gros fichiers par partition
+    buffer = PartitionBuffer(dataset_path, basename_prefix)
+    rows_read = rows_written = 0
+    
+    try:
+        reader = pacsv.open_csv(
+            decompressing_reader(response, codec),
+            read_options=pacsv.ReadOptions(block_size=block_size),
+            convert_options=pacsv.ConvertOptions(column_types=ACHATS_CSV_TYPES)
+        )
+        for batch in reader:
+            df = batch.to_pandas()
+            rows_read += len(df)
+            df = drop_missing_ids(df, ACHATS_SILVER_SCHEMA, ACHATS_ID_COLUMNS)
+            
+            # Même sémantique que drop_duplicates sur le fichier entier : la première occurrence gagne
+            df = df.drop_duplicates(subset=['id_achat'])
+            df = df[~seen_ids.contains(df['id_achat'].to_numpy())]
+            seen_ids.add(df['id_achat'].to_numpy())
+            
+            df_clean = transform_achats(df)
+            buffer.append(df_clean)
+            rows_written += len(df_clean)
+        buffer.flush()
+    finally:
+        response.close()
+        response.release_conn()
+    
+    print(f"Streamed {object_name}: {rows_read} -> {rows_written} rows in {buffer.files} files to {dataset_path}")
+    return seen_ids
+
+
+@flow(name="Silver Transformation Flow", task_runner=get_task_runner())
+def silver_transformation_flow(streaming: bool = False, incremental: bool = False) -> dict:
+    # Clients et achats sont indépendants : les deux chaînes tournent en parallèle sur le task runner
+    clients_df = read_bronze_data.submit("clients.csv", CLIENTS_CSV_DTYPES)
+    clients_clean = clean_clients_data.submit(clients_df)
+    clients_silver = write_to_silver.submit(clients_clean, "clients.parquet", CLIENTS_SILVER_SCHEMA)
+    
+    bronze_achats = list_bronze_achats.submit().result()
+    if not incremental and not bronze_achats:
+        raise FileNotFoundError(f"No bronze/{ACHATS_BRONZE_PREFIX}*.csv object found; run bronze_ingestion_flow first")
     
-    achats_df = read_bronze_data("achats.csv")
-    achats_clean = clean_achats_data(achats_df)
-    achats_silver = write_to_silver(achats_clean, "achats.parquet")
+    if incremental:
+        # Seuls les objets bronze nouveaux ou modifiés sont lus ; leurs lignes sont ajoutées au dataset
+        dataset_path = achats_dataset_path()
+        seen_ids, processed = load_silver_achats_state.submit(dataset_path).result()
+        # Premier passage : tout l'historique est écrit dans une nouvelle génération, publiée à la fin
+        staged = not processed
+        if staged:
+            dataset_path = staging_achats_path()
+        for object_name, etag in bronze_achats.items():
+            if processed.get(object_name) == etag:
+                continue
+            # Noms dérivés de l'objet bronze et de son etag : un run relancé après un échec
+            # réécrit les mêmes fichiers au lieu d'ajouter une seconde copie des lignes
+            seen_ids = stream_achats_to_silver.submit(
+                object_name, seen_ids, dataset_path, f"part-{Path(object_name).stem}-{etag}"
+            )
+            processed[object_name] = etag
+        achats_silver = save_silver_achats_state.submit(seen_ids, processed, dataset_path)
+        if staged:
+            achats_silver = publish_silver_achats.submit(achats_silver)
+    elif streaming:
+        # Réécriture complète de tous les objets bronze dans une génération de staging, publiée une fois l'état sauvegardé
+        dataset_path = staging_achats_path()
+        seen_ids = SortedIdIndex()
+        for object_name, etag in bronze_achats.items():
+            seen_ids = stream_achats_to_silver.submit(
+                object_name, seen_ids, dataset_path, f"part-{Path(object_name).stem}-{etag}"
+            )
+        achats_state = save_silver_achats_state.submit(seen_ids, bronze_achats, dataset_path)
+        achats_silver = publish_silver_achats.submit(achats_state)
+    else:
+        dataset_path = staging_achats_path()
+        # Objets bronze lus en parallèle, puis dédoublonnés dans l'ordre des noms
+        bronze_frames = [read_bronze_data.submit(object_name, ACHATS_CSV_DTYPES) for object_name in bronze_achats]
+        achats_df, seen_ids = dedupe_bronze_achats.submit(bronze_frames).result()
+        achats_clean = clean_achats_data.submit(achats_df)
+        achats_written = write_achats_to_silver.submit(achats_clean, dataset_path)
+        achats_state = save_silver_achats_state.submit(seen_ids, bronze_achats, achats_written)
+        achats_silver = publish_silver_achats.submit(achats_state)
     
     return {
-        "clients": clients_silver,
-        "achats": achats_silver
+        "clients": clients_silver.result(),
+        "achats": achats_silver.result()
     }
 
 
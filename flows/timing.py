@@ -0,0 +1,20 @@
+import functools
+import time
+from datetime import datetime
+
+
+def _clock(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f")[:-3]
+
+
+def timed(fn):
+    """Print the wall-clock start and end of a task, so overlapping tasks show up in the logs."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            end = time.time()
+            print(f"[timing] {fn.__name__}: {_clock(start)} -> {_clock(end)} ({end - start:.3f}s)")
+    return wrapper
@@ -0,0 +1 @@
+"""Mergeable sketches shared by the gold flows and the API."""
@@ -0,0 +1,105 @@
+import math
+
+import numpy as np
+
+# Constantes de splitmix64 (mélange des bits des identifiants avant le découpage index / rang)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+
+
+def precision_for_error(error: float) -> int:
+    """Smallest precision p whose standard error 1.04 / sqrt(2**p) is at most error."""
+    if not 0 < error < 1:
+        raise ValueError(f"HyperLogLog relative error must be in ]0, 1[, got {error}")
+    precision = math.ceil(math.log2((1.04 / error) ** 2))
+    return min(max(precision, MIN_PRECISION), MAX_PRECISION)
+
+
+def standard_error(precision: int) -> float:
+    return 1.04 / math.sqrt(2 ** precision)
+
+
+def hash_ids(ids: np.ndarray) -> np.ndarray:
+    """64-bit hash of integer ids (splitmix64 finaliser)."""
+    h = np.asarray(ids).astype(np.uint64) + _GOLDEN
+    h = (h ^ (h >> np.uint64(30))) * _MIX_1
+    h = (h ^ (h >> np.uint64(27))) * _MIX_2
+    return h ^ (h >> np.uint64(31))
+
+
+def register_updates(ids: np.ndarray, precision: int) -> tuple[np.ndarray, np.ndarray]:
+    """Register index and rank (position of the first 1 bit) of each id."""
+    h = hash_ids(ids)
+    index = (h >> np.uint64(64 - precision)).astype(np.intp)
+    remaining = h & np.uint64((1 << (64 - precision)) - 1)
+    # Longueur binaire via frexp : rang = zéros de tête des 64 - p bits restants, + 1
+    _, bit_length = np.frexp(remaining.astype(np.float64))
+    rank = (64 - precision + 1 - bit_length).astype(np.uint8)
+    return index, rank
+
+
+def sketch_registers(groups: np.ndarray, nb_groups: int, ids: np.ndarray, precision: int) -> np.ndarray:
+    """One sketch per group: registers[g] summarises the ids whose group code is g."""
+    registers = np.zeros((nb_groups, 2 ** precision), dtype=np.uint8)
+    index, rank = register_updates(ids, precision)
+    np.maximum.at(registers, (np.asarray(groups, dtype=np.intp), index), rank)
+    return registers
+
+
+def merge_registers(groups: np.ndarray, nb_groups: int, registers: np.ndarray) -> np.ndarray:
+    """Union of sketches: element-wise maximum of the registers of each group."""
+    merged = np.zeros((nb_groups, registers.shape[1]), dtype=np.uint8)
+    np.maximum.at(merged, np.asarray(groups, dtype=np.intp), registers)
+    return merged
+
+
+def _sigma(x: float) -> float:
+    if x == 1.0:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x: float) -> float:
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y, z = 1.0, 1.0 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+def estimate(registers: np.ndarray) -> np.ndarray:
+    """Estimated number of distinct ids of each sketch (rows of registers).
+
+    Uses Ertl's improved estimator (2017), computed from the histogram of
+    register values: unbiased over the whole range, without the small-range
+    switch to linear counting nor empirical bias tables.
+    """
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    q = 64 - int(math.log2(m))
+
+    counts = []
+    for row in registers:
+        histogram = np.bincount(row, minlength=q + 2)
+        z = m * _tau(1 - histogram[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + histogram[k])
+        z += m * _sigma(histogram[0] / m)
+        counts.append(m * m / (2 * math.log(2) * z))
+    return np.rint(np.array(counts, dtype=np.float64)).astype(np.int64)
@@ -0,0 +1,53 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "flows"))
+
+from bronze_ingestion import stream_copy_object
+from config import BUCKET_BRONZE, get_minio_client
+from silver_transformation import read_bronze_data
+
+
+def benchmark_codec(object_name: str, codec: str | None) -> dict:
+    """
+    Land an object from sources to bronze with the given codec, then read it back like silver does.
+
+    Args:
+        object_name: Object already uploaded to the sources bucket
+        codec: None (raw CSV), "gzip" or "zstd"
+
+    Returns:
+        dict: Stored size and wall times for landing and reading
+    """
+    client = get_minio_client()
+
+    start = time.perf_counter()
+    stream_copy_object(client, object_name, codec=codec)
+    landing_time = time.perf_counter() - start
+
+    stored_bytes = client.stat_object(BUCKET_BRONZE, object_name).size
+
+    start = time.perf_counter()
+    df = read_bronze_data.fn(object_name)
+    read_time = time.perf_counter() - start
+
+    return {
+        "codec": codec or "none",
+        "bytes": stored_bytes,
+        "landing_s": round(landing_time, 3),
+        "read_s": round(read_time, 3),
+        "rows": len(df)
+    }
+
+
+if __name__ == "__main__":
+    object_name = sys.argv[1] if len(sys.argv) > 1 else "achats.csv"
+
+    # Le brut en dernier pour laisser bronze dans son état initial
+    results = [benchmark_codec(object_name, codec) for codec in ("gzip", "zstd", None)]
+    raw_bytes = results[-1]["bytes"]
+
+    print(f"{'codec':<6} {'bytes':>12} {'ratio':>7} {'landing_s':>10} {'read_s':>8}")
+    for r in [results[-1], *results[:-1]]:
+        print(f"{r['codec']:<6} {r['bytes']:>12} {r['bytes'] / raw_bytes:>7.2%} {r['landing_s']:>10} {r['read_s']:>8}")
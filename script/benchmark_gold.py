@@ -0,0 +1,96 @@
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "flows"))
+
+from gold_aggregation import read_silver_achats, read_silver_data
+from gold_engine import compute_gold_tables
+
+
+def scale_achats(achats_df: pd.DataFrame, factor: int) -> pd.DataFrame:
+    """Repeat the purchases factor times with fresh id_achat values."""
+    if factor == 1:
+        return achats_df
+    scaled = pd.concat([achats_df] * factor, ignore_index=True)
+    scaled['id_achat'] = range(1, len(scaled) + 1)
+    return scaled
+
+
+def run_per_table(clients_df: pd.DataFrame, achats_df: pd.DataFrame) -> dict:
+    """Reference: one groupby over the purchases per table, as the gold flow did before the shared engine."""
+    per_client = achats_df.groupby('id_client').agg(
+        nombre_achats=('id_achat', 'count'),
+        montant_total=('montant', 'sum'),
+        montant_moyen=('montant', 'mean'),
+        premier_achat=('date_achat', 'min'),
+        dernier_achat=('date_achat', 'max')
+    ).reset_index()
+    clients_stats = clients_df.merge(per_client, on='id_client', how='left')
+    clients_stats['nombre_achats'] = clients_stats['nombre_achats'].fillna(0).astype(int)
+    clients_stats['montant_total'] = clients_stats['montant_total'].fillna(0)
+    clients_stats['montant_moyen'] = clients_stats['montant_moyen'].fillna(0)
+
+    product_stats = achats_df.groupby('produit', observed=True).agg(
+        nombre_ventes=('id_achat', 'count'),
+        chiffre_affaires=('montant', 'sum'),
+        prix_moyen=('montant', 'mean'),
+        prix_min=('montant', 'min'),
+        prix_max=('montant', 'max')
+    ).reset_index().sort_values('chiffre_affaires', ascending=False)
+
+    annee_mois = achats_df['date_achat'].dt.to_period('M').astype(str).rename('annee_mois')
+    monthly_stats = achats_df.groupby(annee_mois).agg(
+        nombre_achats=('id_achat', 'count'),
+        chiffre_affaires=('montant', 'sum'),
+        panier_moyen=('montant', 'mean'),
+        nombre_clients_uniques=('id_client', 'nunique')
+    ).reset_index()
+
+    data = achats_df.merge(clients_df[['id_client', 'pays']], on='id_client', how='left')
+    country_stats = data.groupby('pays', observed=True).agg(
+        nombre_clients=('id_client', 'nunique'),
+        nombre_achats=('id_achat', 'count'),
+        chiffre_affaires=('montant', 'sum'),
+        panier_moyen=('montant', 'mean')
+    ).reset_index().sort_values('chiffre_affaires', ascending=False)
+
+    return {
+        "clients_stats": clients_stats,
+        "product_stats": product_stats,
+        "monthly_stats": monthly_stats,
+        "country_stats": country_stats
+    }
+
+
+def parquet_bytes(df: pd.DataFrame) -> bytes:
+    # Même écriture que write_to_gold
+    buffer = BytesIO()
+    df.to_parquet(buffer, index=False, engine='pyarrow')
+    return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    factor = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+
+    clients_df = read_silver_data.fn("clients.parquet")
+    achats_df = scale_achats(read_silver_achats.fn(), factor)
+    print(f"Benchmarking on {len(achats_df)} purchases")
+
+    start = time.perf_counter()
+    reference = run_per_table(clients_df, achats_df)
+    per_table_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tables = compute_gold_tables(clients_df, achats_df)
+    engine_time = time.perf_counter() - start
+
+    identical = {name: parquet_bytes(df) == parquet_bytes(tables[name]) for name, df in reference.items()}
+    for name, same in identical.items():
+        print(f"{name:<15} byte-identical: {same}")
+    print(f"per-table groupbys: {per_table_time:.3f}s")
+    print(f"shared engine:      {engine_time:.3f}s ({per_table_time / engine_time:.1f}x)")
+    assert all(identical.values()), f"Gold tables differ from the per-table groupbys: {identical}"
@@ -0,0 +1,104 @@
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "flows"))
+
+from gold_engine import GoldAccumulator, compute_gold_tables
+from schemas import ACHATS_SILVER_SCHEMA, CLIENTS_SILVER_SCHEMA
+from silver_dataset import ACHATS_PARTITIONING, rebatch
+
+ACHATS_COLUMNS = ['id_achat', 'id_client', 'date_achat', 'montant', 'produit']
+NB_CLIENTS = 1500
+PRODUITS = ["Laptop", "Smartphone", "Tablet", "Headphones", "Monitor",
+            "Keyboard", "Mouse", "Printer", "Camera", "Speaker"]
+PAYS = ["France", "Germany", "Spain", "Italy", "Belgium"]
+CHUNK_ROWS = 1_000_000
+
+
+def write_achats(path: str, nb_rows: int) -> None:
+    """Write nb_rows synthetic purchases over 13 months, one chunk at a time."""
+    rng = np.random.default_rng(42)
+    start = np.datetime64('2025-10-01T00:00:00', 'ms')
+    span = np.timedelta64(395, 'D').astype('timedelta64[ms]').astype(np.int64)
+
+    for first in range(0, nb_rows, CHUNK_ROWS):
+        size = min(CHUNK_ROWS, nb_rows - first)
+        dates = start + rng.integers(0, span, size).astype('timedelta64[ms]')
+        years = dates.astype('datetime64[Y]').astype(int) + 1970
+        months = dates.astype('datetime64[M]').astype(int) % 12 + 1
+        table = pa.table({
+            'id_achat': np.arange(first + 1, first + size + 1, dtype=np.int64),
+            'id_client': rng.integers(1, NB_CLIENTS + 1, size, dtype=np.int32),
+            'date_achat': dates,
+            'montant': np.round(rng.uniform(5, 2000, size), 2),
+            'produit': pa.DictionaryArray.from_arrays(
+                rng.integers(0, len(PRODUITS), size, dtype=np.int16), PRODUITS
+            ),
+            'annee': years.astype(np.int16),
+            'mois': months.astype(np.int8),
+        })
+        ds.write_dataset(
+            table, path, format="parquet", partitioning=ACHATS_PARTITIONING,
+            basename_template=f"chunk{first // CHUNK_ROWS}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore"
+        )
+
+
+def clients_frame():
+    return pa.table({
+        'id_client': np.arange(1, NB_CLIENTS + 1, dtype=np.int32),
+        'nom': [f"client {i}" for i in range(1, NB_CLIENTS + 1)],
+        'email': [f"client{i}@example.com" for i in range(1, NB_CLIENTS + 1)],
+        'date_inscription': np.full(NB_CLIENTS, np.datetime64('2025-01-01', 'ms')),
+        'pays': [PAYS[i % len(PAYS)] for i in range(NB_CLIENTS)],
+    }).cast(CLIENTS_SILVER_SCHEMA).to_pandas(date_as_object=False)
+
+
+def measure(mode: str, path: str) -> None:
+    """Run one aggregation mode and print its duration and peak RSS (run in a fresh process)."""
+    dataset = ds.dataset(path, format="parquet", partitioning=ACHATS_PARTITIONING, schema=ACHATS_SILVER_SCHEMA)
+    clients_df = clients_frame()
+
+    start = time.perf_counter()
+    if mode == "full":
+        achats_df = dataset.to_table(columns=ACHATS_COLUMNS).to_pandas(date_as_object=False)
+        compute_gold_tables(clients_df, achats_df)
+    else:
+        batches = dataset.to_batches(columns=ACHATS_COLUMNS, batch_readahead=1, fragment_readahead=1)
+        accumulator = GoldAccumulator(clients_df)
+        for table in rebatch(batches, 1024 * 1024):
+            accumulator.add(table.to_pandas(date_as_object=False))
+        accumulator.tables()
+    elapsed = time.perf_counter() - start
+
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{elapsed:.1f}s {peak_mib:.0f}MiB")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[2], sys.argv[3])
+        sys.exit()
+
+    # Tailles en millions de lignes, ex. : python benchmark_gold_memory.py 1 10 100
+    sizes = [int(size) for size in sys.argv[1:]] or [1, 4, 16]
+    print(f"{'rows':>12} {'full load':>20} {'streaming':>20}")
+    for millions in sizes:
+        with tempfile.TemporaryDirectory() as path:
+            write_achats(path, millions * 1_000_000)
+            results = {
+                mode: subprocess.run(
+                    [sys.executable, __file__, "--measure", mode, path],
+                    capture_output=True, text=True, check=True
+                ).stdout.strip()
+                for mode in ("full", "streaming")
+            }
+        print(f"{millions * 1_000_000:>12} {results['full']:>20} {results['streaming']:>20}")
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pyarrow.dataset as ds
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "flows"))
+
+from benchmark_gold_memory import ACHATS_COLUMNS, clients_frame, write_achats
+from gold_engine import compute_gold_tables, tables_from_partials
+from gold_shards import sharded_partials
+from schemas import ACHATS_SILVER_SCHEMA
+from silver_dataset import ACHATS_PARTITIONING
+
+
+if __name__ == "__main__":
+    # python benchmark_gold_shards.py <millions de lignes> [nombres de workers...]
+    millions = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    cpu_count = os.cpu_count() or 1
+    worker_counts = [int(workers) for workers in sys.argv[2:]] or sorted({1, 2, cpu_count})
+    nb_rows = millions * 1_000_000
+    clients_df = clients_frame()
+
+    with tempfile.TemporaryDirectory() as path:
+        write_achats(path, nb_rows)
+        dataset = ds.dataset(path, format="parquet", partitioning=ACHATS_PARTITIONING, schema=ACHATS_SILVER_SCHEMA)
+        print(f"{nb_rows} purchases, {cpu_count} CPU(s)")
+
+        start = time.perf_counter()
+        achats_df = dataset.to_table(columns=ACHATS_COLUMNS).to_pandas(date_as_object=False)
+        compute_gold_tables(clients_df, achats_df)
+        elapsed = time.perf_counter() - start
+        del achats_df
+        print(f"{'single process':<18} {elapsed:7.2f}s {nb_rows / elapsed / 1e6:6.2f}M rows/s")
+
+        for workers in worker_counts:
+            start = time.perf_counter()
+            tables_from_partials(clients_df, sharded_partials(dataset, path, None, ACHATS_COLUMNS, clients_df, None, workers))
+            elapsed = time.perf_counter() - start
+            print(f"{f'sharded x{workers}':<18} {elapsed:7.2f}s {nb_rows / elapsed / 1e6:6.2f}M rows/s")
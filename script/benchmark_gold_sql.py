@@ -0,0 +1,69 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "flows"))
+
+from gold_aggregation import ACHATS_GOLD_COLUMNS, read_silver_achats, read_silver_data
+from gold_engine import compute_gold_tables
+from gold_sql import compute_gold_tables_sql, read_clients_table, run_gold_sql
+from silver_dataset import read_achats_dataset
+
+
+def scale_achats(achats: pa.Table, factor: int) -> pa.Table:
+    """Repeat the purchases factor times with fresh id_achat values."""
+    if factor == 1:
+        return achats
+    scaled = pa.concat_tables([achats] * factor)
+    index = scaled.schema.get_field_index('id_achat')
+    return scaled.set_column(index, 'id_achat', pa.array(np.arange(1, scaled.num_rows + 1)))
+
+
+def same_tables(reference: dict, tables: dict) -> bool:
+    # Mêmes colonnes et types ; les sommes flottantes peuvent différer au dernier bit
+    for name, df in reference.items():
+        try:
+            pd.testing.assert_frame_equal(
+                df.reset_index(drop=True), tables[name].reset_index(drop=True),
+                check_categorical=False, rtol=1e-9
+            )
+        except AssertionError as error:
+            print(f"{name} differs: {error}")
+            return False
+    return True
+
+
+def timed_run(label: str, function, *args) -> tuple[dict, float]:
+    start = time.perf_counter()
+    tables = function(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:.3f}s")
+    return tables, elapsed
+
+
+def read_and_aggregate_pandas() -> dict:
+    return compute_gold_tables(read_silver_data.fn("clients.parquet"), read_silver_achats.fn())
+
+
+if __name__ == "__main__":
+    factor = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+
+    # 1. De bout en bout sur les fichiers silver de MinIO : lecture + agrégation
+    reference, pandas_time = timed_run("pandas (read + aggregate)", read_and_aggregate_pandas)
+    tables, sql_time = timed_run("sql (read + aggregate)", compute_gold_tables_sql)
+    print(f"same gold tables: {same_tables(reference, tables)}, speedup {pandas_time / sql_time:.1f}x")
+
+    # 2. Agrégation seule, sur les achats répliqués factor fois en mémoire
+    clients = read_clients_table()
+    achats = scale_achats(read_achats_dataset(columns=ACHATS_GOLD_COLUMNS + ['annee', 'mois']), factor)
+    clients_df = clients.drop_columns(['ordre']).to_pandas(date_as_object=False)
+    achats_df = achats.select(ACHATS_GOLD_COLUMNS).to_pandas(date_as_object=False)
+    print(f"Aggregating {achats.num_rows} purchases in memory")
+
+    reference, pandas_time = timed_run("pandas (aggregate only)", compute_gold_tables, clients_df, achats_df)
+    tables, sql_time = timed_run("sql (aggregate only)", run_gold_sql, achats, clients)
+    print(f"same gold tables: {same_tables(reference, tables)}, speedup {pandas_time / sql_time:.1f}x")
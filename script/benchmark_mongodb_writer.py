@@ -0,0 +1,90 @@
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "flows"))
+
+from config import MONGODB_WRITERS
+from mongodb_ingestion import MONGODB_DATABASE, get_mongodb_client, write_to_mongodb
+
+# Collection de mesure, distincte des collections gold servies par l'API
+COLLECTION = "benchmark_writer"
+PAYS = ["France", "Germany", "Spain", "Italy", "Belgium"]
+WRITERS = {"previous": None, "bulk, 1 writer": 1, f"bulk, {MONGODB_WRITERS} writers": MONGODB_WRITERS}
+
+
+def clients_stats_table(nb_rows: int) -> pa.Table:
+    """clients_stats-like gold table: strings, numbers and timestamps, a tenth of clients without purchases."""
+    rng = np.random.default_rng(42)
+    start = np.datetime64('2024-01-01T00:00:00', 'ms')
+    first = start + rng.integers(0, 365 * 86400, nb_rows).astype('timedelta64[s]')
+    no_purchase = rng.random(nb_rows) < 0.1
+    nombre_achats = np.where(no_purchase, 0, rng.integers(1, 30, nb_rows))
+    montant_total = np.where(no_purchase, 0, np.round(rng.uniform(10, 5000, nb_rows), 2))
+    return pa.table({
+        'id_client': np.arange(1, nb_rows + 1, dtype=np.int64),
+        'nom': [f"client {i}" for i in range(1, nb_rows + 1)],
+        'email': [f"client{i}@example.com" for i in range(1, nb_rows + 1)],
+        'date_inscription': np.full(nb_rows, np.datetime64('2023-06-01', 'ms')),
+        'pays': [PAYS[i % len(PAYS)] for i in range(nb_rows)],
+        'nombre_achats': nombre_achats,
+        'montant_total': montant_total,
+        'montant_moyen': np.where(no_purchase, 0, montant_total / np.maximum(nombre_achats, 1)),
+        'premier_achat': pa.array(first, mask=no_purchase),
+        'dernier_achat': pa.array(first + np.timedelta64(30, 'D'), mask=no_purchase),
+    })
+
+
+def previous_writer(collection, df: pd.DataFrame) -> int:
+    """Writer replaced by the bulk writer: copy, dates as strings, one dict list, one ordered insert_many."""
+    collection.drop()
+    df_copy = df.copy()
+    for col in df_copy.columns:
+        if pd.api.types.is_datetime64_any_dtype(df_copy[col]):
+            df_copy[col] = df_copy[col].astype(str)
+    records = df_copy.to_dict('records')
+    return len(collection.insert_many(records).inserted_ids)
+
+
+def measure(writer: str, nb_rows: int) -> None:
+    """Load the table with one writer and print docs/s and RSS growth (run in a fresh process)."""
+    table = clients_stats_table(nb_rows)
+    # Chaque writer reçoit l'entrée qu'il lisait depuis le Parquet gold : DataFrame avant, table Arrow après
+    data = table.to_pandas() if WRITERS[writer] is None else table
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    if WRITERS[writer] is None:
+        inserted = previous_writer(get_mongodb_client()[MONGODB_DATABASE][COLLECTION], data)
+    else:
+        inserted = write_to_mongodb.fn(data, COLLECTION, writers=WRITERS[writer])["rows_inserted"]
+    elapsed = time.perf_counter() - start
+
+    growth_mib = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+    get_mongodb_client()[MONGODB_DATABASE][COLLECTION].drop()
+    print(f"{inserted / elapsed:.0f} docs/s +{growth_mib:.0f}MiB")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[2], int(sys.argv[3]))
+        sys.exit()
+
+    # Tailles en milliers de documents, ex. : python benchmark_mongodb_writer.py 100 1000
+    sizes = [int(size) for size in sys.argv[1:]] or [100, 1000]
+    print(f"{'documents':>10} " + " ".join(f"{writer:>24}" for writer in WRITERS))
+    for thousands in sizes:
+        results = [
+            subprocess.run(
+                [sys.executable, __file__, "--measure", writer, str(thousands * 1000)],
+                capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            for writer in WRITERS
+        ]
+        print(f"{thousands * 1000:>10} " + " ".join(f"{result:>24}" for result in results))
@@ -0,0 +1,40 @@
+import sys
+
+import numpy as np
+from sketches.hyperloglog import estimate, merge_registers, precision_for_error, sketch_registers, standard_error
+
+ERRORS = [0.05, 0.02, 0.01]
+CARDINALITIES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+TRIALS = 20
+
+
+def observed_errors(precision: int, cardinality: int, rng: np.random.Generator) -> np.ndarray:
+    """Relative errors over TRIALS sketches, each built from two shards with duplicated ids."""
+    errors = []
+    for _ in range(TRIALS):
+        ids = rng.choice(10 ** 12, cardinality, replace=False)
+        # Deux "shards" qui se recouvrent : la fusion doit compter chaque id une seule fois
+        shards = [ids[: cardinality * 2 // 3], ids[cardinality // 3:]]
+        registers = np.vstack([sketch_registers(np.zeros(len(shard), dtype=int), 1, shard, precision) for shard in shards])
+        merged = merge_registers(np.zeros(2, dtype=int), 1, registers)
+        errors.append(estimate(merged)[0] / cardinality - 1)
+    return np.array(errors)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(2024)
+    failures = 0
+
+    for error in ERRORS:
+        precision = precision_for_error(error)
+        print(f"target error {error:.2%}: precision {precision}, standard error {standard_error(precision):.2%}")
+        for cardinality in CARDINALITIES:
+            errors = observed_errors(precision, cardinality, rng)
+            rms = np.sqrt(np.mean(errors ** 2))
+            worst = np.max(np.abs(errors))
+            # Erreur quadratique moyenne dans la cible (marge d'échantillonnage), aucun écart au-delà de 4 sigma
+            ok = rms <= 1.2 * error and worst <= 4 * error
+            failures += not ok
+            print(f"  n={cardinality:>9}  rms {rms:.2%}  max {worst:.2%}  {'ok' if ok else 'FAILED'}")
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,79 @@
+"""Load test of the API: concurrent clients replaying the dashboard's request mix.
+
+Measure against the docker-compose MongoDB loaded with the gold tables, 200 clients x 20 requests:
+
+    uvicorn main:app --app-dir api --workers 1
+    python script/load_test_api.py http://localhost:8000 200 20
+
+Shared pooled async MongoDB client (user-020), run once on the commit before the change and once after:
+
+    client                           p50        p99
+    one client per request           not measured yet
+    shared pooled async client       not measured yet
+
+No MongoDB server was reachable where the change was written (the mongo image and mongod
+downloads were unavailable), so the figures remain to be filled in from a run on the stack.
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+import numpy as np
+
+API_URL = "http://localhost:8000"
+
+# Mélange de requêtes proche de celui du dashboard
+ENDPOINTS = [
+    ("/clients", {"limit": 100}),
+    ("/clients", {"limit": 100, "pays": "France"}),
+    ("/products", None),
+    ("/monthly", None),
+    ("/countries", None),
+    ("/top-clients", {"limit": 10}),
+    ("/stats/summary", None),
+]
+
+
+async def client_loop(http: httpx.AsyncClient, requests: int, offset: int, latencies: list, errors: list) -> None:
+    """One simulated client: sends its requests one after the other, cycling over the endpoints."""
+    for i in range(requests):
+        endpoint, params = ENDPOINTS[(offset + i) % len(ENDPOINTS)]
+        start = time.perf_counter()
+        try:
+            response = await http.get(endpoint, params=params)
+            response.raise_for_status()
+        except httpx.HTTPError as error:
+            errors.append(f"{endpoint}: {error!r}")
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def load_test(url: str, concurrency: int, requests: int) -> None:
+    latencies, errors = [], []
+    # Une connexion HTTP par client simulé
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as http:
+        await http.get("/health")
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(http, requests, offset, latencies, errors) for offset in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{concurrency} concurrent clients x {requests} requests against {url}")
+    print(f"  {len(latencies)} ok, {len(errors)} errors in {elapsed:.1f}s ({len(latencies) / elapsed:.0f} req/s)")
+    if len(latencies):
+        p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99])
+        print(f"  latency p50 {p50:.1f}ms  p90 {p90:.1f}ms  p99 {p99:.1f}ms  max {latencies_ms.max():.1f}ms")
+    for error in errors[:5]:
+        print(f"  {error}")
+
+
+if __name__ == "__main__":
+    # python load_test_api.py [url] [clients concurrents] [requêtes par client]
+    url = sys.argv[1] if len(sys.argv) > 1 else API_URL
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    requests = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    asyncio.run(load_test(url, concurrency, requests))
@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# Les flows, scripts et l'API s'importent comme des modules de premier niveau
+ROOT = Path(__file__).parent.parent
+for directory in ("flows", "script", "api"):
+    sys.path.insert(0, str(ROOT / directory))
+
+# Assez de clients par mois pour sortir du comptage linéaire des sketches aux faibles précisions
+NB_CLIENTS = 3000
+AVG_PURCHASES = 4
+
+
+@pytest.fixture(scope="session")
+def sample_data(tmp_path_factory) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Clients and purchases of script/generate_data.py, cleaned as in the silver flow."""
+    from generate_data import generate_achats, generate_clients
+    from silver_transformation import clean_achats_data, clean_clients_data
+
+    directory = tmp_path_factory.mktemp("sources")
+    client_ids = generate_clients(NB_CLIENTS, str(directory / "clients.csv"))
+    generate_achats(client_ids, AVG_PURCHASES, str(directory / "achats.csv"))
+
+    clients_df = clean_clients_data.fn(pd.read_csv(directory / "clients.csv"))
+    achats_df = clean_achats_data.fn(pd.read_csv(directory / "achats.csv"))
+    return clients_df, achats_df
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sketches.hyperloglog import precision_for_error, standard_error
+
+from gold_engine import (
+    SKETCH_PARTIALS,
+    GoldAccumulator,
+    client_sketches,
+    compute_gold_tables,
+    compute_partials,
+    merge_partials,
+    tables_from_partials,
+)
+
+ERRORS = [0.01, 0.05, 0.1]
+BATCH_ROWS = 2000
+
+
+def distinct_counts(tables: dict) -> pd.Series:
+    per_month = tables["monthly_stats"].set_index('annee_mois')['nombre_clients_uniques']
+    per_country = tables["country_stats"].set_index('pays')['nombre_clients']
+    return pd.concat([per_month, per_country])
+
+
+@pytest.mark.parametrize("error", ERRORS)
+def test_estimates_within_error_bound(sample_data, error):
+    clients_df, achats_df = sample_data
+    precision = precision_for_error(error)
+    mois_code = achats_df['date_achat'].dt.year * 12 + achats_df['date_achat'].dt.month - 1
+    sketches = client_sketches(clients_df, mois_code, achats_df['id_client'], precision)
+
+    exact = distinct_counts(compute_gold_tables(clients_df, achats_df))
+    approx = distinct_counts(compute_gold_tables(clients_df, achats_df, sketches))
+
+    # Aucune estimation (mois ou pays) au-delà de 4 écarts-types de l'erreur relative
+    relative = (approx.reindex(exact.index) / exact - 1).abs()
+    assert relative.max() <= 4 * standard_error(precision), relative.sort_values().tail()
+
+
+def test_streamed_sketches_match_one_pass(sample_data):
+    clients_df, achats_df = sample_data
+    precision = precision_for_error(0.05)
+    mois_code = achats_df['date_achat'].dt.year * 12 + achats_df['date_achat'].dt.month - 1
+    sketches = client_sketches(clients_df, mois_code, achats_df['id_client'], precision)
+
+    # L'union des sketches des lots est le sketch de l'ensemble : mêmes estimations, aucun id conservé
+    accumulator = GoldAccumulator(clients_df, sketch_precision=precision)
+    for start in range(0, len(achats_df), BATCH_ROWS):
+        accumulator.add(achats_df.iloc[start:start + BATCH_ROWS])
+
+    assert accumulator.month_clients == {}
+    streamed = distinct_counts(accumulator.tables())
+    one_pass = distinct_counts(compute_gold_tables(clients_df, achats_df, sketches))
+    pd.testing.assert_series_equal(streamed.sort_index(), one_pass.sort_index())
+    assert np.array_equal(
+        accumulator.sketches.sort_values(['mois_code', 'pays'])['registres'].to_numpy(),
+        sketches.sort_values(['mois_code', 'pays'])['registres'].to_numpy()
+    )
+
+
+def test_month_partial_sketches_match_one_pass(sample_data):
+    clients_df, achats_df = sample_data
+    precision = precision_for_error(0.05)
+    mois_code = achats_df['date_achat'].dt.year * 12 + achats_df['date_achat'].dt.month - 1
+    sketches = client_sketches(clients_df, mois_code, achats_df['id_client'], precision)
+
+    # Partiels mensuels du mode incrémental (ou des shards) : leurs sketches s'unissent sans relire les achats
+    partials = merge_partials([
+        compute_partials(clients_df, month_df, sketch_precision=precision)
+        for _, month_df in achats_df.groupby(mois_code)
+    ])
+    rolled_up = distinct_counts(tables_from_partials(clients_df, partials, partials[SKETCH_PARTIALS]))
+    one_pass = distinct_counts(compute_gold_tables(clients_df, achats_df, sketches))
+    pd.testing.assert_series_equal(rolled_up.sort_index(), one_pass.sort_index())
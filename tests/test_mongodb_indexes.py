@@ -0,0 +1,123 @@
+import os
+from functools import partial
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo import AsyncMongoClient, MongoClient, monitoring
+from pymongo.errors import PyMongoError
+
+import main
+import mongodb_ingestion
+from gold_aggregation import aggregate_gold_tables
+
+MONGODB_URI = os.getenv("MONGODB_URI", main.MONGODB_URI)
+# Base de test, supprimée à la fin : les collections gold servies par l'API ne sont pas touchées
+TEST_DATABASE = "bigdata_test_indexes"
+
+# Une requête par forme de requête de l'API (filtres, tris, projections)
+REQUESTS = [
+    ("/clients", None),
+    ("/clients", {"pays": "France"}),
+    ("/clients", {"skip": 100, "limit": 50}),
+    ("/clients", {"pays": "France", "cursor": main.encode_cursor(100, "France")}),
+    ("/clients/export", {"pays": "France"}),
+    ("/products", None),
+    ("/monthly", None),
+    ("/countries", None),
+    ("/top-clients", {"limit": 10}),
+    ("/stats/summary", None),
+    ("/cube", None),
+    ("/cube", {"produit": "Laptop"}),
+    ("/cube", {"pays": "France", "group_by": "annee_mois"}),
+    ("/cube", {"mois_debut": "2025-10", "mois_fin": "2025-12"}),
+]
+
+# Commandes de lecture expliquées ; champs ajoutés par le driver, refusés dans un explain
+EXPLAINED_COMMANDS = ("find", "aggregate", "count", "distinct")
+DRIVER_FIELDS = ("lsid", "txnNumber", "$clusterTime", "$db", "$readPreference")
+
+
+class QueryRecorder(monitoring.CommandListener):
+    """Record the read commands sent by the API while it serves a request."""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name in EXPLAINED_COMMANDS:
+            command = {key: value for key, value in event.command.items() if key not in DRIVER_FIELDS}
+            self.commands.append((event.database_name, command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def plan_stages(node) -> set[str]:
+    """Stage names of the winning plans of an explain output (rejected plans ignored)."""
+    stages = set()
+    if isinstance(node, dict):
+        if "stage" in node:
+            stages.add(node["stage"])
+        for key, value in node.items():
+            if key != "rejectedPlans":
+                stages |= plan_stages(value)
+    elif isinstance(node, list):
+        for item in node:
+            stages |= plan_stages(item)
+    return stages
+
+
+@pytest.fixture(scope="module")
+def mongodb():
+    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip(f"No MongoDB server at {MONGODB_URI}")
+    yield client
+    client.drop_database(TEST_DATABASE)
+    client.close()
+
+
+@pytest.fixture(scope="module")
+def api(mongodb, sample_data):
+    """API client and query recorder over the gold tables of the sample data, loaded in the test database."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(mongodb_ingestion, "MONGODB_URI", MONGODB_URI)
+        patch.setattr(mongodb_ingestion, "MONGODB_DATABASE", TEST_DATABASE)
+        patch.setattr(main, "MONGODB_URI", MONGODB_URI)
+        patch.setattr(main, "MONGODB_DATABASE", TEST_DATABASE)
+        mongodb_ingestion.get_mongodb_client.cache_clear()
+
+        for name, df in aggregate_gold_tables.fn(*sample_data).items():
+            mongodb_ingestion.write_to_mongodb.fn(df, name)
+        mongodb_ingestion.materialize_summary.fn()
+        mongodb_ingestion.stamp_data_version.fn(list(mongodb_ingestion.NATURAL_KEYS))
+        mongodb_ingestion.get_mongodb_client.cache_clear()
+
+        # Listener passé au seul client créé par l'API pour ce test, pas enregistré globalement :
+        # aucun autre client du processus ne l'appelle, et il disparaît avec le client
+        recorder = QueryRecorder()
+        patch.setattr(main, "AsyncMongoClient", partial(AsyncMongoClient, event_listeners=[recorder]))
+        with TestClient(main.app) as client:
+            yield client, recorder
+    mongodb_ingestion.get_mongodb_client.cache_clear()
+
+
+@pytest.mark.parametrize("endpoint, params", REQUESTS, ids=[f"{endpoint} {params or ''}" for endpoint, params in REQUESTS])
+def test_queries_use_an_index(mongodb, api, endpoint, params):
+    client, recorder = api
+    # Réponse en cache : aucune requête n'atteindrait MongoDB
+    main.response_cache.entries.clear()
+    recorder.commands.clear()
+    client.get(endpoint, params=params).raise_for_status()
+    assert recorder.commands, f"{endpoint} sent no read command"
+
+    for database, command in list(recorder.commands):
+        explain = mongodb[database].command("explain", command, verbosity="queryPlanner")
+        stages = plan_stages(explain)
+        assert "COLLSCAN" not in stages, f"{next(iter(command))} {command.get(next(iter(command)))}: {sorted(stages)}"